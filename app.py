@@ -5,35 +5,18 @@ os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 from dotenv import load_dotenv
 load_dotenv()
 
-# Monkeypatch for GenerationConfig.MediaResolution error
-import google.generativeai.types as types
-try:
-    if not hasattr(types.GenerationConfig, 'MediaResolution'):
-        class MediaResolution:
-            UNSPECIFIED = 0
-            LOW = 1
-            MEDIUM = 2
-            HIGH = 3
-        types.GenerationConfig.MediaResolution = MediaResolution
-except Exception:
-    pass
-
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 import pandas as pd
 import numpy as np
-import os
 import math
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from sklearn.impute import SimpleImputer
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from dotenv import load_dotenv
 from chatbot import chatbot_bp
 import similarity_service
 import gemini_service
-
-load_dotenv()
+import jobs
+import llm_client
+import player_store
+import undervalued_service
+import warmup
 
 app = Flask(__name__)
 # Add a secret key for session management
@@ -43,31 +26,31 @@ app.register_blueprint(chatbot_bp)
 # Global variables for models and data
 models = {}
 data = None
+# Upper bound on query players per /api/similar_players/batch request
+MAX_BATCH_PLAYERS = 100
+_data_version = None
 
 def load_data():
     """Load the processed player data"""
-    global data
-    # Try multiple possible data sources so the API is resilient when one file is missing
-    # Prefer the cleaned players dataset (with market values) when available
-    candidates = [
-        'players_data_with_weights.csv',
-        os.path.join('moneyball_report_outputs', 'data chatbot.csv'),
-        os.path.join('moneyball_report_outputs', 'data chatbot.csv')
-    ]
-
-    for path in candidates:
-        try:
-            if os.path.exists(path):
-                data = pd.read_csv(path)
-                # Normalize Player column to string
+    global data, _data_version
+    # Prefer the cleaned players dataset (with market values) when available,
+    # otherwise share the process-wide frame held by player_store
+    override = 'players_data_with_weights.csv'
+    try:
+        if os.path.exists(override):
+            if data is None:
+                data = pd.read_csv(override)
                 if 'Player' in data.columns:
                     data['Player'] = data['Player'].astype(str)
-                return True
-        except Exception as e:
-            # try next candidate
-            continue
+            return True
 
-    return False
+        version = player_store.version()
+        if data is None or version != _data_version:
+            data = player_store.get_players()
+            _data_version = version
+        return True
+    except Exception:
+        return False
 
 @app.route('/')
 def index():
@@ -108,15 +91,12 @@ def player_page():
 def get_filter_options():
     """Get available filter options for the undervalued players page"""
     try:
-        # Load results from the analysis
-        results_df = pd.read_csv('moneyball_report_outputs/all_predictions_with_undervaluation (19).csv')
-        
-        # Apply filters (using original column names)
+        options = undervalued_service.get_filter_options()
         
         return jsonify({
             'success': True,
-            'leagues': results_df['Comp'].unique().tolist(),
-            'squads': results_df['Squad'].unique().tolist()
+            'leagues': options['leagues'],
+            'squads': options['squads']
         })
     except Exception as e:
         return jsonify({
@@ -124,91 +104,51 @@ def get_filter_options():
             'error': str(e)
         })
 
+def _undervalued_filters(payload):
+    """Extract the undervalued-player filters shared by paging and export"""
+    return {
+        'position': payload.get('position', 'ALL'),
+        'league': payload.get('league', 'ALL'),
+        'squad': payload.get('squad', 'ALL'),
+        'min_age': payload.get('min_age'),
+        'max_age': payload.get('max_age'),
+        'min_value': payload.get('min_value'),
+        'max_value': payload.get('max_value'),
+        'min_undervaluation': payload.get('min_undervaluation')
+    }
+
 @app.route('/api/undervalued', methods=['POST'])
 def get_undervalued():
     """API endpoint for undervalued players"""
     try:
         # Get filter parameters
-        position = request.json.get('position', 'ALL')
-        league = request.json.get('league', 'ALL')
-        squad = request.json.get('squad', 'ALL')
+        filters = _undervalued_filters(request.json)
         page = request.json.get('page', 1)
         items_per_page = request.json.get('items_per_page', 25)
         sort_column = request.json.get('sort_column', 'undervaluation')
         sort_direction = request.json.get('sort_direction', 'desc')
-        min_age = request.json.get('min_age')
-        max_age = request.json.get('max_age')
-        min_value = request.json.get('min_value')
-        max_value = request.json.get('max_value')
-        min_undervaluation = request.json.get('min_undervaluation')
-        
-        # Load results from the analysis
-        results_df = pd.read_csv('moneyball_report_outputs/all_predictions_with_undervaluation (19).csv')
         
-        # Apply filters (using original column names)
-        
-        
-        if position != 'ALL':
-            results_df = results_df[results_df['Model_Pos'] == position]
-            
-        if league != 'ALL':
-            results_df = results_df[results_df['Comp'] == league]
-            
-        if squad != 'ALL':
-            results_df = results_df[results_df['Squad'] == squad]
-            
-        if min_age is not None:
-            results_df = results_df[results_df['Age'] >= min_age]
-            
-        if max_age is not None:
-            results_df = results_df[results_df['Age'] <= max_age]
-            
-        if min_value is not None:
-            results_df = results_df[results_df['Market_Value_Million_EUR'] >= min_value]
-            
-        if max_value is not None:
-            results_df = results_df[results_df['Market_Value_Million_EUR'] <= max_value]
-            
-        if min_undervaluation is not None:
-            results_df = results_df[results_df['Undervaluation'] >= min_undervaluation]
-
-        # Get total count before pagination
-        total_items = len(results_df)
-
-        # Map frontend column names to DataFrame columns
-        column_mapping = {
-            'rank': 'Undervaluation',  # Default to undervaluation for rank
-            'player': 'Player',
-            'position': 'Main_Pos',
-            'team': 'Squad',
-            'league': 'Comp',
-            'age': 'Age',
-            'market_value': 'Market_Value_Million_EUR',
-            'predicted_value': 'Predicted_Value',
-            'undervaluation': 'Undervaluation'  # Make sure this matches the column name exactly
-        }
-
-        # Ensure numeric columns are properly typed
-        numeric_columns = ['Age', 'Market_Value_Million_EUR', 'Predicted_Value', 'Undervaluation']
-        for col in numeric_columns:
-            results_df[col] = pd.to_numeric(results_df[col], errors='coerce')
-
-        # Sort the data
-        sort_col = column_mapping.get(sort_column, 'Undervaluation')
+        # Filter with the cached bitmap indexes and page through the presorted
+        # permutation for the requested column
         ascending = sort_direction == 'asc'
-        print(f"Sorting by column: {sort_col}, ascending: {ascending}")  # Debug log
         
-        # Ensure the column exists
-        if sort_col not in results_df.columns:
-            print(f"Warning: Column {sort_col} not found in DataFrame. Available columns: {results_df.columns.tolist()}")
-            sort_col = 'Undervaluation'  # Fallback to default
-            
-        results_df = results_df.sort_values(sort_col, ascending=ascending)
+        # Opt-in keyset pagination: resume after the row encoded in `cursor`
+        if request.json.get('pagination') == 'cursor':
+            page_data, total_items, next_cursor = undervalued_service.query_cursor(
+                filters, sort_column=sort_column, ascending=ascending,
+                cursor=request.json.get('cursor'), limit=items_per_page
+            )
+            return jsonify({
+                'success': True,
+                'data': page_data.to_dict('records'),
+                'total_items': total_items,
+                'next_cursor': next_cursor
+            })
         
-        # Apply pagination
-        start_idx = (page - 1) * items_per_page
-        end_idx = start_idx + items_per_page
-        page_data = results_df.iloc[start_idx:end_idx]
+        page_data, total_items = undervalued_service.query_page(
+            filters, sort_column=sort_column, ascending=ascending,
+            page=page, items_per_page=items_per_page
+        )
         
         return jsonify({
             'success': True,
@@ -221,12 +161,31 @@ def get_undervalued():
             'error': str(e)
         })
 
+@app.route('/api/undervalued/export', methods=['POST'])
+def export_undervalued():
+    """Stream the full filtered undervalued set as NDJSON, CSV or Arrow IPC"""
+    try:
+        payload = request.json or {}
+        body, mimetype = undervalued_service.export_stream(
+            _undervalued_filters(payload),
+            fmt=payload.get('format', 'ndjson'),
+            sort_column=payload.get('sort_column', 'undervaluation'),
+            ascending=payload.get('sort_direction', 'desc') == 'asc'
+        )
+        return Response(body, mimetype=mimetype)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
 @app.route('/api/players', methods=['GET'])
 def get_players():
     """Get list of all players"""
     try:
-        if data is None:
-            load_data()
+        load_data()
         
         players = data[['Player', 'Team', 'league', 'Position']].to_dict('records')
         return jsonify({
@@ -243,8 +202,7 @@ def get_players():
 def get_player_details(player_name):
     """Get details for a specific player"""
     try:
-        if data is None:
-            load_data()
+        load_data()
         # Perform case-insensitive exact match first
         if 'Player' not in data.columns:
             return jsonify({'success': False, 'error': 'Player column not available in data'})
@@ -316,8 +274,7 @@ def compare_players_api():
         if not isinstance(names, list) or len(names) < 2:
             return jsonify({'success': False, 'error': 'Provide at least two player names in "players" list'}), 400
 
-        if data is None:
-            load_data()
+        load_data()
 
         def _sanitize_value(v):
             try:
@@ -373,8 +330,7 @@ def compare_players_api():
 def api_meta():
     """Get metadata for filters (leagues, positions)"""
     try:
-        similarity_service._ensure_loaded()
-        df = similarity_service._df_players
+        df = similarity_service._ensure_loaded()["df"]
         leagues = sorted(df["league"].dropna().astype(str).unique().tolist()) if "league" in df else []
         pos_set = set()
         if "Position" in df.columns:
@@ -438,9 +394,33 @@ def api_similar_players():
     except Exception as e:
         return jsonify({"ok": False, "detail": str(e)})
 
+@app.route('/api/similar_players/batch', methods=['POST'])
+def api_similar_players_batch():
+    """Get similar players for many query players sharing one set of filters"""
+    payload = request.json or {}
+    player_ids = payload.get('player_ids') or []
+    if not isinstance(player_ids, list) or len(player_ids) == 0:
+        return jsonify({"ok": False, "detail": "Provide a non-empty \"player_ids\" list."}), 400
+    if len(player_ids) > MAX_BATCH_PLAYERS:
+        return jsonify({"ok": False, "detail": f"At most {MAX_BATCH_PLAYERS} players per batch."}), 400
+    
+    filters = {
+        "min_age": payload.get('min_age'),
+        "max_age": payload.get('max_age'),
+        "leagues": payload.get('leagues'),
+        "positions": payload.get('positions')
+    }
+    
+    try:
+        k = int(payload.get('k', 10))
+        res = similarity_service.get_similar_players_batch(player_ids, top_k=k, filters=filters)
+        return jsonify(similarity_service.clean({"ok": True, "results": res}))
+    except Exception as e:
+        return jsonify({"ok": False, "detail": str(e)})
+
 @app.route('/api/compare_players', methods=['POST'])
 def api_compare_players_new():
-    """Compare multiple players and generate AI report"""
+    """Compare multiple players; the AI report is generated in a background job"""
     try:
         payload = request.json or {}
         player_ids = payload.get('player_ids', [])
@@ -463,20 +443,77 @@ def api_compare_players_new():
             rows.append({"Rk": p.get("Rk"), "stats": row})
             
         ai_payload = {"players": players, "radar": radars}
-        ai_report = gemini_service.generate_comparison_report(ai_payload)
+        # Serve a cached report inline; otherwise return the stats now and let
+        # the client poll /api/jobs/<report_job> for the report
+        ai_report = gemini_service.get_cached_report(ai_payload)
+        report_job = None
+        report_detail = None
+        if ai_report is None:
+            try:
+                # Keyed by the report cache key so any worker can answer the poll
+                report_job = jobs.submit('comparison_report', gemini_service.generate_comparison_report, ai_payload,
+                                         raise_errors=True, job_id=gemini_service.report_cache_key(players))
+            except jobs.JobQueueFull as e:
+                report_detail = str(e)
         
         return jsonify(similarity_service.clean({
             "ok": True,
             "players": players,
             "radar": radars,
             "compare_stats": {"keys": keys, "rows": rows},
-            "ai_report": ai_report
+            "ai_report": ai_report,
+            "report_job": report_job,
+            "report_detail": report_detail
         }))
     except Exception as e:
         return jsonify({"ok": False, "detail": str(e)})
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """Status of a background job, with its result once done"""
+    job = jobs.get(job_id)
+    if job is None:
+        # The job may belong to another worker; its report is shared through
+        # the report cache (REPORT_CACHE_DB) once written
+        report = gemini_service.get_report_by_key(job_id)
+        if report is not None:
+            job = {"id": job_id, "kind": "comparison_report", "status": "done", "result": report, "error": None}
+    if job is None:
+        return jsonify({"ok": False, "detail": "Job not found or expired."}), 404
+    return jsonify(similarity_service.clean({"ok": True, "job": job}))
+
+
+@app.route('/api/ready', methods=['GET'])
+def api_ready():
+    """Readiness probe: 200 once warmup has finished, 503 while it is running"""
+    state = warmup.status()
+    if not state['ready']:
+        return jsonify({"ok": False, "detail": "Warming up.", **state}), 503
+    return jsonify({"ok": True, **state})
+
+
+def _warm_chatbot_search():
+    import rag_service_simple
+    if rag_service_simple.load_data() is None:
+        raise RuntimeError("chatbot search state unavailable")
+
+
+warmup.add_step('players', player_store.get_players)
+warmup.add_step('app_data', load_data)
+warmup.add_step('similarity', similarity_service.load_players_df)
+warmup.add_step('undervalued', undervalued_service.get_filter_options)
+warmup.add_step('chatbot_search', _warm_chatbot_search)
+warmup.add_step('llm', lambda: llm_client.get_client().warm())
+
+
+@app.before_request
+def _start_warmup():
+    # Per worker, on its first request: a thread started at import would not
+    # survive gunicorn --preload forking the workers
+    warmup.start()
+
+
 if __name__ == '__main__':
-    load_data()
     app.run(debug=True)
 
@@ -0,0 +1,193 @@
+"""
+Benchmark the live_api path against the local replay server (no network).
+
+Runs get_player_live_summary, get_live_matches_summary and
+get_team_recent_matches from --users concurrent threads in four phases:
+
+- cold: empty cache; identical concurrent requests should coalesce.
+- warm: every answer comes from the response cache.
+- stale: entries past their fresh TTL are served at once and refreshed in the
+  background (stale-while-revalidate).
+- flush: cache cleared again, to measure the fan-out under --latency.
+
+Reports per-function latency percentiles, failed calls and how many requests
+reached the replay server. Fixtures come from --fixtures (see live_replay.py
+--record) or, if that file does not exist, from a synthetic data set.
+
+    python bench_live_api.py --users 16 --latency 0.2 --jitter 0.1
+    python bench_live_api.py --record      # capture real responses once (needs API keys)
+
+Exits non-zero when calls fail and --error-rate is 0, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from live_replay import LIVE_FIXTURES, ReplayServer, load_fixtures, synthetic_fixtures
+
+DEFAULT_PLAYERS = ['pedri', 'jude bellingham', 'bukayo saka']
+DEFAULT_TEAMS = ['arsenal', 'barcelona']
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _workload(live_api, players: List[str], teams: List[str]) -> List[Tuple[str, Callable[[], Any]]]:
+    calls: List[Tuple[str, Callable[[], Any]]] = [('get_live_matches_summary', live_api.get_live_matches_summary)]
+    calls += [('get_player_live_summary', lambda n=n: live_api.get_player_live_summary(n)) for n in players]
+    calls += [('get_team_recent_matches', lambda t=t: live_api.get_team_recent_matches(t)) for t in teams]
+    return calls
+
+
+def run_phase(server: ReplayServer, calls: List[Tuple[str, Callable[[], Any]]], users: int) -> Dict[str, Any]:
+    """Run every call once per user, all users at once; return timings and upstream request count."""
+    timings: Dict[str, List[float]] = {name: [] for name, _ in calls}
+    failures: Dict[str, int] = {name: 0 for name, _ in calls}
+    lock = threading.Lock()
+    barrier = threading.Barrier(users)
+    before = server.stats()['requests']
+
+    def user():
+        barrier.wait()
+        for name, fn in calls:
+            start = time.perf_counter()
+            try:
+                ok = fn() is not None
+            except Exception as e:
+                print(f'[bench] {name} raised {e}')
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                timings[name].append(elapsed)
+                if not ok:
+                    failures[name] += 1
+
+    threads = [threading.Thread(target=user) for _ in range(users)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    return {
+        'wall_s': round(wall, 3),
+        'upstream_requests': server.stats()['requests'] - before,
+        'functions': {
+            name: {
+                'calls': len(values),
+                'failed': failures[name],
+                'p50_ms': round(_percentile(values, 50) * 1000, 1),
+                'p95_ms': round(_percentile(values, 95) * 1000, 1),
+                'max_ms': round(max(values) * 1000, 1) if values else 0.0,
+            }
+            for name, values in timings.items()
+        },
+    }
+
+
+def _expire_fresh(live_api) -> None:
+    """Mark every cached live response stale, as if its fresh TTL had passed."""
+    with live_api._cache._lock:
+        for _, entry in live_api._cache._entries.values():
+            entry['fresh_until'] = 0.0
+
+
+def _print_phase(name: str, result: Dict[str, Any]) -> None:
+    print(f"\n{name}: {result['wall_s']}s wall, {result['upstream_requests']} upstream requests")
+    print(f"  {'function':<26}{'calls':>6}{'failed':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for fn, row in result['functions'].items():
+        print(f"  {fn:<26}{row['calls']:>6}{row['failed']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['max_ms']:>10}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark live_api against the local replay server.')
+    parser.add_argument('--fixtures', default=LIVE_FIXTURES, help='fixtures JSON file (default: %(default)s)')
+    parser.add_argument('--record', action='store_true', help='run once against the real APIs and save fixtures')
+    parser.add_argument('--users', type=int, default=8, help='concurrent simulated users')
+    parser.add_argument('--latency', type=float, default=0.1, help='replay latency per request, seconds')
+    parser.add_argument('--jitter', type=float, default=0.05, help='extra random replay latency, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of replay requests that fail')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--players', nargs='+', default=DEFAULT_PLAYERS)
+    parser.add_argument('--teams', nargs='+', default=DEFAULT_TEAMS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', dest='json_out', help='also write the results to this file')
+    args = parser.parse_args()
+
+    if args.record:
+        server = ReplayServer(fixtures_path=args.fixtures, record=True)
+        source = f'recording to {args.fixtures}'
+    elif os.path.exists(args.fixtures):
+        server = ReplayServer(load_fixtures(args.fixtures), latency=args.latency, jitter=args.jitter,
+                              error_rate=args.error_rate, error_status=args.error_status, seed=args.seed)
+        source = args.fixtures
+    else:
+        server = ReplayServer(synthetic_fixtures(args.players, args.teams), latency=args.latency,
+                              jitter=args.jitter, error_rate=args.error_rate, error_status=args.error_status,
+                              seed=args.seed)
+        source = 'synthetic fixtures'
+    server.start()
+
+    # live_api reads its configuration at import time
+    os.environ['API_FOOTBALL_BASE'] = f'{server.url}/api-football'
+    os.environ['SOFASCORE_BASE'] = f'{server.url}/sofascore'
+    if not args.record:
+        os.environ.setdefault('API_FOOTBALL_KEY', 'replay')
+        os.environ.setdefault('SOFASCORE_RAPIDAPI_KEY', 'replay')
+        os.environ.setdefault('API_FOOTBALL_RATE_PER_MIN', '0')
+        os.environ.setdefault('SOFASCORE_RATE_PER_MIN', '0')
+    os.environ.setdefault('LIVE_CACHE_DB', '')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import live_api
+
+    calls = _workload(live_api, args.players, args.teams)
+    try:
+        if args.record:
+            result = run_phase(server, calls, 1)
+            _print_phase('record', result)
+            print(f"\n[bench] Recorded {server.stats()['recorded']} responses to {args.fixtures}")
+            return 0
+
+        print(f'[bench] {args.users} users against {source} on {server.url} '
+              f'(latency {args.latency}s + up to {args.jitter}s, error rate {args.error_rate})')
+        results: Dict[str, Any] = {}
+        results['cold'] = run_phase(server, calls, args.users)
+        results['warm'] = run_phase(server, calls, args.users)
+        _expire_fresh(live_api)
+        before = server.stats()['requests']
+        results['stale'] = run_phase(server, calls, args.users)
+        # Let the background refreshes finish before they are counted
+        settle = time.monotonic() + 30
+        while live_api._revalidating and time.monotonic() < settle:
+            time.sleep(0.05)
+        results['stale']['revalidations'] = server.stats()['requests'] - before
+        live_api._cache.clear()
+        results['flush'] = run_phase(server, calls, args.users)
+        results['server'] = server.stats()
+
+        for phase in ('cold', 'warm', 'stale', 'flush'):
+            _print_phase(phase, results[phase])
+        print(f"\n[bench] stale phase triggered {results['stale']['revalidations']} background refreshes")
+        print(f"[bench] replay server: {results['server']}")
+        if args.json_out:
+            with open(args.json_out, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+        failed = sum(row['failed'] for phase in ('cold', 'warm', 'stale', 'flush')
+                     for row in results[phase]['functions'].values())
+        return 1 if failed and not args.error_rate else 0
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
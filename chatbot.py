@@ -1,57 +1,24 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, Response, request, jsonify, session, stream_with_context
 
-import google.generativeai as genai
-
-# Conversation history storage
-conversation_histories = {}
-import os
+import json
+import uuid
 import pandas as pd
 from typing import Optional, Dict, Any
 
 import live_api
+from conversation_store import ConversationStore
 
 chatbot_bp = Blueprint('chatbot_bp', __name__)
 
-import google.generativeai.types as types
-
-# Configure the Gemini API (optional; if key not set, model calls will fail later)
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
-
-def _load_player_data() -> pd.DataFrame:
-    """Load the preferred cleaned CSV if available, otherwise fallback to predictions CSV."""
-    candidates = [
-        os.path.join('moneyball_report_outputs', 'data chatbot.csv'),
-        os.path.join('moneyball_report_outputs', 'data chatbot.csv')
-    ]
-    for p in candidates:
-        try:
-            if os.path.exists(p):
-                df = pd.read_csv(p)
-                if 'Player' in df.columns:
-                    df['Player'] = df['Player'].astype(str)
-                return df
-        except Exception:
-            continue
-    return pd.DataFrame()
-
-
-data = _load_player_data()
+# Conversation history storage; the session cookie only carries the id
+conversations = ConversationStore()
 
 
-# Construct a small dataset context for the model
-if not data.empty and 'Undervaluation' in data.columns:
-    top_undervalued = data.sort_values(by='Undervaluation', ascending=False).head(5)
-    initial_context = (
-        "You are a football analytics assistant. For context, here are the top 5 undervalued players from the dataset:\n"
-        + top_undervalued.to_string()
-    )
-else:
-    initial_context = "You are a football analytics assistant. Use available player data and public knowledge to answer questions about players, performance and market value."
-
-
-# Use Gemini model wrapper
-model = genai.GenerativeModel('gemini-2.0-flash')
+def _conversation_id() -> str:
+    conversation_id = session.get('conversation_id')
+    if not conversation_id:
+        conversation_id = session['conversation_id'] = uuid.uuid4().hex
+    return conversation_id
 
 
 def _find_player_by_name(name: str, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
@@ -88,18 +55,16 @@ def chatbot():
         return jsonify({'reply': 'Please enter a message.'})
 
     try:
-        # start chat with optional session history
-        chat_history = session.get('chat_history', [])
+        # start chat with this conversation's server-side history
+        conversation_id = _conversation_id()
+        history = conversations.history(conversation_id)
         
         # Try to use Simple Direct Search RAG (No APIs, No PyTorch!)
         try:
             from rag_service_simple import get_rag_response
-            rag_response = get_rag_response(message)
+            rag_response = get_rag_response(message, history)
             
-            # Update history (simple append for now)
-            chat_history.append({"role": "user", "parts": [message]})
-            chat_history.append({"role": "model", "parts": [rag_response]})
-            session['chat_history'] = chat_history
+            conversations.append(conversation_id, message, rag_response)
             
             return jsonify({'reply': rag_response})
         except Exception as e:
@@ -114,8 +79,60 @@ def chatbot():
 
 
 
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@chatbot_bp.route('/api/chatbot/stream', methods=['POST'])
+def chatbot_stream():
+    """Streaming variant of /api/chatbot using Server-Sent Events.
+
+    Retrieval and prompt building finish before the response starts, so the
+    stream opens with the model's first chunk. Each ``delta`` event carries a
+    piece of the reply; ``done`` or ``error`` ends the stream. Requests that
+    fail before streaming get the same JSON reply as /api/chatbot.
+    """
+    payload = request.json or {}
+    message = payload.get('message', '')
+
+    if not message:
+        return jsonify({'reply': 'Please enter a message.'})
+
+    # Resolved before streaming: the session cookie cannot change afterwards
+    conversation_id = _conversation_id()
+    try:
+        from rag_service_simple import prepare_rag_response, stream_rag_response
+        prepared = prepare_rag_response(message, conversations.history(conversation_id))
+    except Exception as e:
+        print(f"RAG Error: {e}")
+        return jsonify({'reply': "I'm sorry, I couldn't retrieve the information from my database at this time."})
+
+    def events():
+        parts = []
+        try:
+            for chunk in stream_rag_response(prepared):
+                parts.append(chunk)
+                yield _sse('delta', {'text': chunk})
+            conversations.append(conversation_id, message, ''.join(parts))
+            yield _sse('done', {})
+        except Exception as e:
+            print(f"RAG stream error: {e}")
+            yield _sse('error', {'reply': f"Sorry, an error occurred: {str(e)}"})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        # Stop proxies (e.g. nginx) from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @chatbot_bp.route('/api/chatbot/reset', methods=['POST'])
 def reset_chatbot():
+    conversation_id = session.get('conversation_id')
+    if conversation_id:
+        conversations.reset(conversation_id)
+    # Drop the cookie history written by older versions as well
     session.pop('chat_history', None)
     return jsonify({'status': 'Chat history reset'})
 
@@ -0,0 +1,170 @@
+"""
+Server-side chatbot conversation memory.
+
+Only a conversation id lives in the Flask session cookie; turns are kept here,
+in the {'user', 'assistant'} shape get_rag_response expects. Each stored turn
+is truncated to CHAT_TURN_CHARS characters per side. Once a conversation's
+estimated size passes CHAT_HISTORY_TOKENS, its oldest turns are dropped. At
+most CHAT_MAX_CONVERSATIONS conversations are kept, least recently used
+evicted first.
+
+By default conversations live in this process's memory, so with several
+workers a conversation continues only on the worker that holds it. Set
+CHAT_HISTORY_DB to a SQLite path (it may be the file the response caches use)
+to keep them in a table every worker shares.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+
+CHAT_HISTORY_TOKENS = int(os.getenv('CHAT_HISTORY_TOKENS', 1000))
+CHAT_TURN_CHARS = int(os.getenv('CHAT_TURN_CHARS', 600))
+CHAT_MAX_CONVERSATIONS = int(os.getenv('CHAT_MAX_CONVERSATIONS', 1000))
+CHAT_HISTORY_DB = os.getenv('CHAT_HISTORY_DB', '')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def _truncate(text: str, limit: int) -> str:
+    text = str(text)
+    return text if len(text) <= limit else text[:limit].rstrip() + '...'
+
+
+def _turn_tokens(turn: Dict[str, str]) -> int:
+    return estimate_tokens(turn['user']) + estimate_tokens(turn['assistant'])
+
+
+class ConversationStore:
+    """Conversation turns in memory, or in SQLite when ``db_path`` is set.
+
+    A SQLite error is logged; reads then return no history and writes are lost.
+    """
+
+    def __init__(self, token_budget: int = CHAT_HISTORY_TOKENS, turn_chars: int = CHAT_TURN_CHARS,
+                 max_conversations: int = CHAT_MAX_CONVERSATIONS, db_path: Optional[str] = CHAT_HISTORY_DB):
+        self.token_budget = token_budget
+        self.turn_chars = turn_chars
+        self.max_conversations = max_conversations
+        self.db_path = db_path or None
+        self._lock = threading.Lock()
+        self._conversations: 'OrderedDict[str, Deque[Dict[str, str]]]' = OrderedDict()
+        self._tokens: Dict[str, int] = {}
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS conversations '
+                        '(id TEXT PRIMARY KEY, turns TEXT NOT NULL, updated REAL NOT NULL)'
+                    )
+            except sqlite3.Error as e:
+                print(f"[chatbot] Keeping conversations in memory, SQLite unavailable: {e}")
+                self.db_path = None
+
+    @contextmanager
+    def _connect(self):
+        """Connection that commits on success and is always closed."""
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def history(self, conversation_id: str) -> List[Dict[str, str]]:
+        """Stored turns for the conversation, oldest first."""
+        if self.db_path:
+            return self._db_history(conversation_id)
+        with self._lock:
+            turns = self._conversations.get(conversation_id)
+            if turns is None:
+                return []
+            self._conversations.move_to_end(conversation_id)
+            return [dict(turn) for turn in turns]
+
+    def append(self, conversation_id: str, user: str, assistant: str) -> None:
+        turn = {'user': _truncate(user, self.turn_chars), 'assistant': _truncate(assistant, self.turn_chars)}
+        if self.db_path:
+            self._db_append(conversation_id, turn)
+            return
+        cost = _turn_tokens(turn)
+        with self._lock:
+            turns = self._conversations.get(conversation_id)
+            if turns is None:
+                turns = self._conversations[conversation_id] = deque()
+                self._tokens[conversation_id] = 0
+            self._conversations.move_to_end(conversation_id)
+            turns.append(turn)
+            self._tokens[conversation_id] += cost
+            # Always keep the newest turn, even if it alone exceeds the budget
+            while len(turns) > 1 and self._tokens[conversation_id] > self.token_budget:
+                old = turns.popleft()
+                self._tokens[conversation_id] -= _turn_tokens(old)
+            while len(self._conversations) > self.max_conversations:
+                evicted, _ = self._conversations.popitem(last=False)
+                del self._tokens[evicted]
+
+    def reset(self, conversation_id: str) -> None:
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute('DELETE FROM conversations WHERE id = ?', (conversation_id,))
+            except sqlite3.Error as e:
+                print(f"[chatbot] SQLite reset failed: {e}")
+            return
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+            self._tokens.pop(conversation_id, None)
+
+    def __len__(self) -> int:
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    return conn.execute('SELECT COUNT(*) FROM conversations').fetchone()[0]
+            except sqlite3.Error as e:
+                print(f"[chatbot] SQLite count failed: {e}")
+                return 0
+        return len(self._conversations)
+
+    def _db_history(self, conversation_id: str) -> List[Dict[str, str]]:
+        try:
+            with self._connect() as conn:
+                row = conn.execute('SELECT turns FROM conversations WHERE id = ?', (conversation_id,)).fetchone()
+                if row is None:
+                    return []
+                conn.execute('UPDATE conversations SET updated = ? WHERE id = ?', (time.time(), conversation_id))
+                return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[chatbot] SQLite read failed: {e}")
+            return []
+
+    def _db_append(self, conversation_id: str, turn: Dict[str, str]) -> None:
+        try:
+            with self._connect() as conn:
+                # Take the write lock up front so concurrent appends from other
+                # workers don't overwrite each other's turns
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute('SELECT turns FROM conversations WHERE id = ?', (conversation_id,)).fetchone()
+                turns = json.loads(row[0]) if row else []
+                turns.append(turn)
+                tokens = sum(_turn_tokens(t) for t in turns)
+                while len(turns) > 1 and tokens > self.token_budget:
+                    tokens -= _turn_tokens(turns.pop(0))
+                conn.execute(
+                    'INSERT OR REPLACE INTO conversations (id, turns, updated) VALUES (?, ?, ?)',
+                    (conversation_id, json.dumps(turns), time.time()),
+                )
+                conn.execute(
+                    'DELETE FROM conversations WHERE id NOT IN '
+                    '(SELECT id FROM conversations ORDER BY updated DESC LIMIT ?)',
+                    (self.max_conversations,),
+                )
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[chatbot] SQLite write failed: {e}")
@@ -0,0 +1,121 @@
+"""
+Entity extraction for chatbot messages.
+
+An Aho-Corasick automaton over normalized aliases (player names, teams,
+leagues, positions) finds every mention in a message with one pass over its
+characters, however many aliases there are. Only matches on word boundaries
+count, and overlapping matches resolve to the leftmost, then longest, alias,
+so "Manchester City" wins over a player surnamed "City". Aliases that are
+also everyday words can be marked ``cased``: they only count when capitalised
+in the message ("Nice" the club, not "a nice striker").
+"""
+import re
+from collections import deque
+from typing import Collection, Dict, Hashable, Iterator, List, Tuple
+
+import unidecode
+
+_NON_WORD = re.compile(r"[^A-Za-z0-9]+")
+
+
+def _fold(text) -> str:
+    """Unidecoded text with every non-alphanumeric run collapsed to one space, case kept."""
+    return _NON_WORD.sub(" ", unidecode.unidecode(str(text))).strip()
+
+
+def normalize(text) -> str:
+    """Unidecoded, lowercased text with every non-alphanumeric run collapsed to one space."""
+    return _fold(text).lower()
+
+
+class EntityIndex:
+    """Aho-Corasick matcher mapping normalized aliases to (kind, value) entities.
+
+    ``vocabularies`` maps a kind to ``{alias: value}``; when two aliases
+    normalize to the same text, the one seen first wins. Aliases in ``cased``
+    (compared normalized) must start with a capital letter in the message.
+    """
+
+    def __init__(self, vocabularies: Dict[str, Dict[str, Hashable]], cased: Collection[str] = ()):
+        cased = {normalize(alias) for alias in cased}
+        self._cased = set()
+        patterns: Dict[str, Tuple[str, Hashable]] = {}
+        for kind, aliases in vocabularies.items():
+            for alias, value in aliases.items():
+                key = normalize(alias)
+                if key:
+                    patterns.setdefault(key, (kind, value))
+
+        self._entities: List[Tuple[str, Hashable]] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        # Per state: (pattern length, entity id) for every alias ending there
+        self._out: List[List[Tuple[int, int]]] = [[]]
+        for key, entity in patterns.items():
+            state = 0
+            for ch in key:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._out.append([])
+                state = nxt
+            if key in cased:
+                self._cased.add(len(self._entities))
+            self._out[state].append((len(key), len(self._entities)))
+            self._entities.append(entity)
+        self._link()
+
+    def _link(self) -> None:
+        """Breadth-first failure links, merging each state's outputs with its fallback's."""
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def _scan(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, ch in enumerate(text, 1):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, entity in out[state]:
+                yield end - length, end, entity
+
+    def mentions(self, text: str) -> List[Tuple[int, int, str, Hashable]]:
+        """(start, end, kind, value) for each mention, as offsets into ``normalize(text)``."""
+        folded = _fold(text)
+        text = folded.lower()
+        matches = [
+            (start, end, entity) for start, end, entity in self._scan(text)
+            if (start == 0 or text[start - 1] == " ") and (end == len(text) or text[end] == " ")
+            and (entity not in self._cased or folded[start].isupper())
+        ]
+        matches.sort(key=lambda m: (m[0], -m[1]))
+        found: List[Tuple[int, int, str, Hashable]] = []
+        covered = 0
+        for start, end, entity in matches:
+            if start < covered:
+                continue
+            covered = end
+            found.append((start, end) + self._entities[entity])
+        return found
+
+    def extract(self, text: str) -> List[Tuple[str, Hashable]]:
+        """Distinct (kind, value) entities mentioned in ``text``, in mention order."""
+        found: List[Tuple[str, Hashable]] = []
+        for _, _, kind, value in self.mentions(text):
+            if (kind, value) not in found:
+                found.append((kind, value))
+        return found
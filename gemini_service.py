@@ -1,12 +1,7 @@
-import os
+from typing import Dict, Any, List, Optional
 
-import google.generativeai as genai
-from typing import Dict, Any
-
-# Configure Gemini
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+import llm_client
+from response_cache import ResponseCache, SingleFlight, make_key
 
 AI_PROMPT_TEMPLATE = """
 You are an elite European football scouting analyst.
@@ -21,56 +16,105 @@ Your analysis should:
 - Keep the summary concise (~300 words max)
 """
 
-def generate_comparison_report(payload: Dict[str, Any]) -> str:
-    if not GOOGLE_API_KEY:
+BRIEF_KEYS = [
+    "Goals", "Gls", "Performance Gls",
+    "Assists", "Ast", "Performance Ast",
+    "KP", "Key Passes",
+    "xG", "Expected xG",
+    "xAG", "Expected xA",
+    "Int", "Interceptions",
+    "Tkl", "Tackles Tkl",
+    "Won", "Aerial Duels Won"
+]
+
+# Reports are content-addressed: LLM backend, sorted player ids, the prompt
+# template and the exact player data the prompt is built from. A changed template or a data
+# reload therefore misses instead of serving a stale report.
+# REPORT_CACHE_SIZE / REPORT_CACHE_TTL (seconds) / REPORT_CACHE_DB (SQLite path).
+# Set REPORT_CACHE_DB when running several workers: report jobs are tracked per
+# process, and polls that land on another worker find the report through it.
+_report_cache = ResponseCache.from_env('comparison_reports', 'REPORT_CACHE', maxsize=256, ttl=24 * 3600)
+_report_flights = SingleFlight()
+_TEMPLATE_HASH = make_key(AI_PROMPT_TEMPLATE, BRIEF_KEYS)
+
+
+def _get_val(obj: Dict[str, Any], key: str):
+    """Value for key, or for key without its Performance/Expected/Standard prefix."""
+    if key in obj:
+        return obj[key]
+    simple_key = key.replace("Performance ", "").replace("Expected ", "").replace("Standard ", "")
+    if simple_key in obj:
+        return obj[simple_key]
+    return None
+
+
+def _player_line(p: Dict[str, Any]) -> str:
+    # The payload comes from similarity_service, which may use original or
+    # normalized column names
+    name = p.get("Player", "Unknown")
+    pos  = p.get("Position", p.get("Pos", ""))  # Try Position first, fallback to Pos
+    club = p.get("Team", p.get("Squad", ""))  # Try Team first, fallback to Squad
+    snippet = []
+    for k in BRIEF_KEYS:
+        val = _get_val(p, k)
+        if val is not None:
+            snippet.append(f"{k}: {val}")
+    return f"- {name} | {pos} | {club} | " + "; ".join(snippet)
+
+
+def build_comparison_prompt(players: List[Dict[str, Any]]) -> str:
+    lines = [AI_PROMPT_TEMPLATE.strip(), "\nPLAYER DATA:\n"]
+    lines.extend(_player_line(p) for p in players)
+    lines.append("\nProvide a direct comparison and a summary.\n")
+    return "\n".join(lines)
+
+
+def report_cache_key(players: List[Dict[str, Any]]) -> str:
+    """Same players with the same data give the same key, whatever their order."""
+    ids = sorted(str(p.get("Rk", p.get("Player"))) for p in players)
+    data_hash = make_key(sorted(_player_line(p) for p in players))
+    return make_key("comparison", llm_client.get_client().name, ids, _TEMPLATE_HASH, data_hash)
+
+
+def get_cached_report(payload: Dict[str, Any]) -> Optional[str]:
+    """Cached report for the payload's players, without calling the model."""
+    return _report_cache.get(report_cache_key(payload.get("players", [])))
+
+
+def get_report_by_key(key: str) -> Optional[str]:
+    """Cached report stored under ``key`` (a report_cache_key), if any."""
+    return _report_cache.get(key)
+
+
+def generate_comparison_report(payload: Dict[str, Any], raise_errors: bool = False) -> str:
+    """Comparison report text; failures come back as an "Error ..." string,
+    or are raised with ``raise_errors`` (background jobs, so the job fails)."""
+    client = llm_client.get_client()
+    if not client.configured():
+        if raise_errors:
+            raise RuntimeError("GOOGLE_API_KEY not found in environment variables.")
         return "Error: GOOGLE_API_KEY not found in environment variables."
 
     try:
         players = payload.get("players", [])
-        
-        lines = [AI_PROMPT_TEMPLATE.strip(), "\nPLAYER DATA:\n"]
-        brief_keys = [
-            "Goals", "Gls", "Performance Gls",
-            "Assists", "Ast", "Performance Ast",
-            "KP", "Key Passes",
-            "xG", "Expected xG",
-            "xAG", "Expected xA",
-            "Int", "Interceptions",
-            "Tkl", "Tackles Tkl",
-            "Won", "Aerial Duels Won"
-        ]
-        
-        # Mapping for brief keys if they differ in payload
-        # The payload comes from similarity_service which should have normalized keys or original keys
-        # We'll try to find the keys or their mapped equivalents
-        
-        for p in players:
-            name = p.get("Player", "Unknown")
-            pos  = p.get("Position", p.get("Pos", ""))  # Try Position first, fallback to Pos
-            club = p.get("Team", p.get("Squad", ""))  # Try Team first, fallback to Squad
-            snippet = []
-            
-            # Helper to find value even if key is slightly different
-            def get_val(obj, key):
-                if key in obj: return obj[key]
-                # Try simple mapping
-                simple_key = key.replace("Performance ", "").replace("Expected ", "").replace("Standard ", "")
-                if simple_key in obj: return obj[simple_key]
-                return None
-
-            for k in brief_keys:
-                val = get_val(p, k)
-                if val is not None:
-                    snippet.append(f"{k}: {val}")
-            
-            lines.append(f"- {name} | {pos} | {club} | " + "; ".join(snippet))
-        
-        lines.append("\nProvide a direct comparison and a summary.\n")
-        prompt_text = "\n".join(lines)
-
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(prompt_text)
-        
-        return response.text
+        key = report_cache_key(players)
+        cached = _report_cache.get(key)
+        if cached is not None:
+            return cached
+
+        def _generate() -> str:
+            # A flight that finished while we were queued may have filled it
+            cached = _report_cache.get(key)
+            if cached is not None:
+                return cached
+            text = client.generate(build_comparison_prompt(players))
+            if not llm_client.is_degraded(text):
+                _report_cache.set(key, text)
+            return text
+
+        # Concurrent identical requests share one model call
+        return _report_flights.do(key, _generate)
     except Exception as e:
+        if raise_errors:
+            raise
         return f"Error generating report: {str(e)}"
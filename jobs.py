@@ -0,0 +1,100 @@
+"""
+Background jobs for slow work such as AI reports.
+
+A request submits a callable and returns the job id straight away; clients
+poll /api/jobs/<id> for the status and, once finished, the result. At most
+JOB_WORKERS jobs run at a time and at most JOB_QUEUE_LIMIT are accepted
+(queued + running), so a burst of LLM calls neither pins the Flask workers
+nor queues without bound. Finished jobs are kept for JOB_TTL seconds.
+
+Job state lives in the memory of the worker process that accepted the job.
+Callers that need polls to work across workers submit under a deterministic
+job_id and keep the result somewhere shared: comparison reports use their
+report cache key, and /api/jobs falls back to the report cache, which every
+worker sees only when REPORT_CACHE_DB is set.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_QUEUE_LIMIT = int(os.getenv('JOB_QUEUE_LIMIT', 32))
+JOB_TTL = float(os.getenv('JOB_TTL', 600))
+
+
+class JobQueueFull(RuntimeError):
+    """Raised by submit when JOB_QUEUE_LIMIT jobs are already queued or running."""
+
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+_slots = threading.BoundedSemaphore(JOB_QUEUE_LIMIT)
+_lock = threading.Lock()
+_jobs: Dict[str, Dict[str, Any]] = {}
+
+
+def _expired(job: Dict[str, Any], now: float) -> bool:
+    return job['finished_at'] is not None and now - job['finished_at'] > JOB_TTL
+
+
+def _update(job_id: str, **fields) -> None:
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+
+def _run(job_id: str, fn: Callable[..., Any], args, kwargs) -> None:
+    _update(job_id, status='running', started_at=time.time())
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        print(f"[jobs] Job {job_id} failed: {e}")
+        _update(job_id, status='failed', error=str(e), finished_at=time.time())
+    else:
+        _update(job_id, status='done', result=result, finished_at=time.time())
+    finally:
+        _slots.release()
+
+
+def submit(kind: str, fn: Callable[..., Any], *args, job_id: Optional[str] = None, **kwargs) -> str:
+    """Queue fn(*args, **kwargs) and return its job id; raises JobQueueFull when saturated.
+
+    With ``job_id`` given and a job under that id still queued or running, that
+    job's id is returned and nothing new is queued.
+    """
+    if not _slots.acquire(blocking=False):
+        raise JobQueueFull("Too many background jobs in progress, try again shortly.")
+    job_id = job_id or uuid.uuid4().hex
+    now = time.time()
+    with _lock:
+        for old_id in [jid for jid, job in _jobs.items() if _expired(job, now)]:
+            del _jobs[old_id]
+        existing = _jobs.get(job_id)
+        if existing is not None and existing['finished_at'] is None:
+            _slots.release()
+            return job_id
+        _jobs[job_id] = {
+            'id': job_id, 'kind': kind, 'status': 'queued', 'result': None, 'error': None,
+            'created_at': now, 'started_at': None, 'finished_at': None,
+        }
+    try:
+        _executor.submit(_run, job_id, fn, args, kwargs)
+    except RuntimeError:
+        # Executor shut down (interpreter exit)
+        _slots.release()
+        with _lock:
+            _jobs.pop(job_id, None)
+        raise
+    return job_id
+
+
+def get(job_id: str) -> Optional[Dict[str, Any]]:
+    """Snapshot of a job, or None if unknown or expired."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or _expired(job, time.time()):
+            return None
+        return dict(job)
@@ -1,6 +1,13 @@
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import requests
-from typing import Optional, Dict, Any, List
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, Any, List, Callable, Sequence
+
+from response_cache import ResponseCache, SingleFlight, make_key
 
 # API-Football helper. Uses api-sports v3 (https://v3.football.api-sports.io).
 # Provide API key via the environment variable API_FOOTBALL_KEY.
@@ -8,9 +15,247 @@ from typing import Optional, Dict, Any, List
 API_FOOTBALL_KEY = os.getenv('API_FOOTBALL_KEY')
 API_FOOTBALL_BASE = os.getenv('API_FOOTBALL_BASE', 'https://v3.football.api-sports.io')
 
+# Per-request timeout, overall deadline for a fan-out of probes, and the
+# sizes of the shared connection pool and probe thread pool
+LIVE_API_TIMEOUT = float(os.getenv('LIVE_API_TIMEOUT', 10))
+LIVE_API_DEADLINE = float(os.getenv('LIVE_API_DEADLINE', 15))
+LIVE_API_POOL_SIZE = int(os.getenv('LIVE_API_POOL_SIZE', 16))
+LIVE_API_WORKERS = int(os.getenv('LIVE_API_WORKERS', 12))
+
+# Client-side rate limits (requests per minute, shared by the whole process;
+# 0 disables; set API_FOOTBALL_RATE_PER_MIN to your plan's ceiling, e.g. 10 on
+# the free plan) and retries with jittered exponential backoff on 429/5xx
+API_FOOTBALL_RATE_PER_MIN = float(os.getenv('API_FOOTBALL_RATE_PER_MIN', 300))
+SOFASCORE_RATE_PER_MIN = float(os.getenv('SOFASCORE_RATE_PER_MIN', 60))
+LIVE_API_RETRIES = int(os.getenv('LIVE_API_RETRIES', 2))
+LIVE_API_BACKOFF = float(os.getenv('LIVE_API_BACKOFF', 0.5))
+LIVE_API_BACKOFF_MAX = 8.0
+
+# Response cache: in-memory LRU, plus a SQLite file shared by workers and kept
+# across restarts when LIVE_CACHE_DB is set (off by default; *.sqlite3 files are
+# git-ignored). Entries are fresh for their endpoint's TTL and then
+# served stale for LIVE_CACHE_STALE_RATIO x TTL more while a background
+# request refreshes them.
+LIVE_CACHE_DB = os.getenv('LIVE_CACHE_DB', '')
+LIVE_CACHE_SIZE = int(os.getenv('LIVE_CACHE_SIZE', 1024))
+LIVE_CACHE_STALE_RATIO = float(os.getenv('LIVE_CACHE_STALE_RATIO', 1.0))
+LIVE_CACHE_DEFAULT_TTL = 600
+# Fresh lifetime in seconds per endpoint path
+CACHE_TTLS = {
+    'fixtures:live': 15,
+    'fixtures': 3 * 3600,
+    'players': 24 * 3600,
+    'teams': 7 * 24 * 3600,
+    'tvchannels/get-available-countries': 24 * 3600,
+}
+
+_cache = ResponseCache('live_api', maxsize=LIVE_CACHE_SIZE, db_path=LIVE_CACHE_DB)
+# Identical requests already in flight share one upstream call
+_flights = SingleFlight()
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=LIVE_API_WORKERS, thread_name_prefix='live_api')
+# Background refreshes get their own threads so they never queue ahead of probes
+_refresh_executor = ThreadPoolExecutor(max_workers=max(1, LIVE_API_WORKERS // 3), thread_name_prefix='live_api_refresh')
+
+
+class _TokenBucket:
+    """Thread-safe token bucket refilling ``per_minute`` tokens a minute, ``burst`` at most.
+
+    The default burst is five seconds' worth of tokens, so no sliding minute
+    sees much more than ``per_minute`` requests.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(self.rate * 5, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> bool:
+        """Take a token, waiting until ``deadline`` (time.monotonic) at most."""
+        if self.rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+_api_football_bucket = _TokenBucket(API_FOOTBALL_RATE_PER_MIN)
+_sofascore_bucket = _TokenBucket(SOFASCORE_RATE_PER_MIN)
+
+
+def _get_session() -> requests.Session:
+    """Process-wide keep-alive session with a bounded connection pool."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=LIVE_API_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def _timeout_until(deadline: Optional[float]) -> float:
+    """Request timeout, shortened so it never runs past ``deadline`` (time.monotonic)."""
+    if deadline is None:
+        return LIVE_API_TIMEOUT
+    return min(LIVE_API_TIMEOUT, deadline - time.monotonic())
+
+
+def _backoff(attempt: int, retry_after: Optional[str]) -> float:
+    """Full-jitter exponential delay, or the server's Retry-After seconds when given."""
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), LIVE_API_BACKOFF_MAX) + random.uniform(0, LIVE_API_BACKOFF)
+    except ValueError:
+        # HTTP-date form; fall back to our own schedule
+        pass
+    return random.uniform(0, min(LIVE_API_BACKOFF_MAX, LIVE_API_BACKOFF * 2 ** (attempt + 1)))
+
+
+def _send(bucket: _TokenBucket, url: str, headers: Dict[str, str], params: Optional[Dict[str, Any]],
+          deadline: Optional[float]) -> Optional[requests.Response]:
+    """GET through the rate limiter, retrying 429 and 5xx responses with backoff.
+
+    Returns the last response, or None when the deadline (LIVE_API_DEADLINE
+    from now if not given) passes before a request can be sent. Network
+    errors propagate to the caller.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + LIVE_API_DEADLINE
+    resp = None
+    for attempt in range(LIVE_API_RETRIES + 1):
+        if not bucket.acquire(deadline):
+            print(f'[live_api] Rate limit: no request slot before the deadline for {url}')
+            return resp
+        timeout = _timeout_until(deadline)
+        if timeout <= 0:
+            return resp
+        resp = _get_session().get(url, headers=headers, params=params or {}, timeout=timeout)
+        if resp.status_code != 429 and resp.status_code < 500:
+            return resp
+        if attempt == LIVE_API_RETRIES:
+            break
+        delay = _backoff(attempt, resp.headers.get('Retry-After'))
+        if time.monotonic() + delay >= deadline:
+            break
+        print(f'[live_api] {url} returned {resp.status_code}, retrying in {delay:.1f}s')
+        time.sleep(delay)
+    return resp
+
+
+def _first_hit(probes: Sequence[Callable[[float], Any]], end: Optional[float] = None) -> Any:
+    """Run probes concurrently and return the first non-None result in priority order.
+
+    Each probe is called with the absolute deadline ``end`` (time.monotonic;
+    LIVE_API_DEADLINE from now by default). A hit is returned as soon as every
+    higher-priority probe has missed; probes that have not started yet are
+    cancelled. Returns None if nothing hits before the deadline.
+    """
+    if end is None:
+        end = time.monotonic() + LIVE_API_DEADLINE
+    futures = [_executor.submit(probe, end) for probe in probes]
+    try:
+        for future in futures:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                result = future.result(timeout=remaining)
+            except FutureTimeout:
+                print('[live_api] Deadline reached before a hit')
+                break
+            except Exception as e:
+                print(f'[live_api] Probe failed: {e}')
+                continue
+            if result is not None:
+                return result
+        return None
+    finally:
+        for future in futures:
+            future.cancel()
+
 
-def _call_api(path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
-    """Call api-football and return parsed JSON or None on error."""
+def _cache_ttl(path: str, params: Optional[Dict[str, Any]]) -> float:
+    name = path.strip('/')
+    if name == 'fixtures' and params and 'live' in params:
+        name = 'fixtures:live'
+    return CACHE_TTLS.get(name, LIVE_CACHE_DEFAULT_TTL)
+
+
+def _store(key: str, ttl: float, data: Optional[Dict[str, Any]]) -> None:
+    # Failed calls and api-football error payloads (quota, bad params) are not cached
+    if data is None or (isinstance(data, dict) and data.get('errors')):
+        return
+    _cache.set(key, {'data': data, 'fresh_until': time.time() + ttl}, ttl=ttl * (1 + LIVE_CACHE_STALE_RATIO))
+
+
+def _revalidate(key: str, ttl: float, fetch: Callable[[Optional[float]], Optional[Dict[str, Any]]]) -> None:
+    """Refresh a stale entry in the background, once per key at a time."""
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def run():
+        try:
+            _store(key, ttl, fetch(None))
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+
+    try:
+        _refresh_executor.submit(run)
+    except RuntimeError:
+        # Executor shut down (interpreter exit)
+        with _revalidating_lock:
+            _revalidating.discard(key)
+
+
+def _cached(base: str, path: str, params: Optional[Dict[str, Any]], deadline: Optional[float],
+            fetch: Callable[[Optional[float]], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """fetch(deadline) through the response cache, keyed by base URL, path and params."""
+    key = make_key(base, path, params or {})
+    ttl = _cache_ttl(path, params)
+    entry = _cache.get(key)
+    if entry is not None:
+        if time.time() >= entry['fresh_until']:
+            _revalidate(key, ttl, fetch)
+        return entry['data']
+
+    def load() -> Optional[Dict[str, Any]]:
+        data = fetch(deadline)
+        _store(key, ttl, data)
+        return data
+
+    return _flights.do(key, load)
+
+
+def _call_api(path: str, params: Optional[Dict[str, Any]] = None,
+              deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Call api-football (cached) and return parsed JSON or None on error."""
+    return _cached(API_FOOTBALL_BASE, path, params, deadline, lambda d: _fetch_api(path, params, d))
+
+
+def _fetch_api(path: str, params: Optional[Dict[str, Any]] = None,
+               deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Request api-football and return parsed JSON or None on error."""
     if not API_FOOTBALL_KEY:
         # No key configured
         print('[live_api] API_FOOTBALL_KEY not configured')
@@ -18,11 +263,16 @@ def _call_api(path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Di
     url = f"{API_FOOTBALL_BASE.rstrip('/')}/{path.lstrip('/')}"
     headers = {'x-apisports-key': API_FOOTBALL_KEY}
     try:
-        resp = requests.get(url, headers=headers, params=params or {}, timeout=10)
+        resp = _send(_api_football_bucket, url, headers, params, deadline)
+        if resp is None:
+            return None
         if resp.status_code != 200:
             print(f"[live_api] api-football returned status {resp.status_code}: {resp.text}")
             return None
         return resp.json()
+    except requests.Timeout:
+        print(f'[live_api] api-football timed out: {path} {params}')
+        return None
     except Exception:
         import traceback
         print('[live_api] Exception when calling api-football:')
@@ -49,29 +299,37 @@ def get_player_live_summary(name: str) -> Optional[Dict[str, Any]]:
     # This is a heuristic since we don't know the player's league.
     common_leagues = [39, 2, 140, 78, 135, 61] # PL, CL, La Liga, Bundesliga, Serie A, Ligue 1
     seasons = [2024, 2023]
-    
-    for season in seasons:
-        for league in common_leagues:
-            j = _call_api('players', {'search': name, 'league': league, 'season': season})
+
+    def probe(season: int, league: int) -> Callable[[float], Optional[Dict[str, Any]]]:
+        def run(deadline: float) -> Optional[Dict[str, Any]]:
+            j = _call_api('players', {'search': name, 'league': league, 'season': season}, deadline)
             if j and 'response' in j:
                 items = j.get('response') or []
                 if items:
-                    # Found a match
-                    first = items[0]
-                    player = first.get('player') or {}
-                    statistics = first.get('statistics') or []
-
-                    summary = {
-                        'name': player.get('name'),
-                        'nationality': player.get('nationality'),
-                        'age': player.get('age') if 'age' in player else None,
-                        'photo': player.get('photo'),
-                        'team': (statistics[0].get('team', {}).get('name')) if statistics else None,
-                        'league_stats': statistics,
-                        'source': 'api-football'
-                    }
-                    return summary
-    return None
+                    return items[0]
+            return None
+        return run
+
+    # All league/season probes run at once; the earliest season and league in
+    # the lists above still win, as with the old sequential walk
+    first = _first_hit([probe(season, league) for season in seasons for league in common_leagues])
+    if first is None:
+        return None
+
+    # Found a match
+    player = first.get('player') or {}
+    statistics = first.get('statistics') or []
+
+    summary = {
+        'name': player.get('name'),
+        'nationality': player.get('nationality'),
+        'age': player.get('age') if 'age' in player else None,
+        'photo': player.get('photo'),
+        'team': (statistics[0].get('team', {}).get('name')) if statistics else None,
+        'league_stats': statistics,
+        'source': 'api-football'
+    }
+    return summary
 
 
 def get_live_matches_summary(limit: int = 5) -> Optional[str]:
@@ -104,8 +362,11 @@ def get_live_matches_summary(limit: int = 5) -> Optional[str]:
 
 def get_team_recent_matches(team_name: str, last: int = 5) -> Optional[str]:
     """Return a short summary of recent matches for a team (uses teams + fixtures endpoints)."""
+    # One deadline covers the team lookup and the season probes
+    end = time.monotonic() + LIVE_API_DEADLINE
+
     # Find team
-    j_team = _call_api('teams', {'search': team_name})
+    j_team = _call_api('teams', {'search': team_name}, end)
     if not j_team or 'response' not in j_team:
         return None
     resp = j_team.get('response') or []
@@ -121,14 +382,16 @@ def get_team_recent_matches(team_name: str, last: int = 5) -> Optional[str]:
     # Workaround: Fetch matches for the current/recent season and filter locally.
     # We'll try 2024 first (covering 2024-2025), then 2023 if needed.
     # Note: In a production app, we should dynamically determine the current season.
-    matches = []
-    for season in [2025, 2024, 2023]:
-        j_fixtures = _call_api('fixtures', {'team': team_id, 'season': season})
-        if j_fixtures and 'response' in j_fixtures:
-            season_matches = j_fixtures.get('response') or []
-            if season_matches:
-                matches = season_matches
-                break
+    def probe(season: int) -> Callable[[float], Optional[List[Dict[str, Any]]]]:
+        def run(deadline: float) -> Optional[List[Dict[str, Any]]]:
+            j_fixtures = _call_api('fixtures', {'team': team_id, 'season': season}, deadline)
+            if j_fixtures and 'response' in j_fixtures:
+                return j_fixtures.get('response') or None
+            return None
+        return run
+
+    # Seasons are fetched concurrently; the most recent one with matches wins
+    matches = _first_hit([probe(season) for season in [2025, 2024, 2023]], end) or []
     
     if not matches:
         return f"No recent matches found for {found_name} (checked seasons 2025, 2024)."
@@ -166,7 +429,12 @@ SOFASCORE_BASE = os.getenv('SOFASCORE_BASE', 'https://sofascore.p.rapidapi.com')
 
 
 def _call_sofascore(path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
-    """Call the SofaScore RapidAPI proxy and return parsed JSON or None on error.
+    """Call the SofaScore RapidAPI proxy (cached) and return parsed JSON or None on error."""
+    return _cached(SOFASCORE_BASE, path, params, None, lambda d: _fetch_sofascore(path, params))
+
+
+def _fetch_sofascore(path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Request the SofaScore RapidAPI proxy and return parsed JSON or None on error.
 
     `path` should start with a slash (e.g. '/tvchannels/get-available-countries').
     The RapidAPI key must be provided in the environment variable SOFASCORE_RAPIDAPI_KEY.
@@ -179,8 +447,8 @@ def _call_sofascore(path: str, params: Optional[Dict[str, Any]] = None) -> Optio
         'x-rapidapi-host': SOFASCORE_RAPIDAPI_HOST,
     }
     try:
-        resp = requests.get(url, headers=headers, params=params or {}, timeout=10)
-        if resp.status_code != 200:
+        resp = _send(_sofascore_bucket, url, headers, params, None)
+        if resp is None or resp.status_code != 200:
             return None
         # Attempt to parse JSON; SofaScore sometimes returns nested structures
         return resp.json()
@@ -0,0 +1,253 @@
+"""
+Record/replay fixture server for live_api.
+
+Point live_api at it by setting, before the app starts:
+
+    API_FOOTBALL_BASE=http://127.0.0.1:8765/api-football
+    SOFASCORE_BASE=http://127.0.0.1:8765/sofascore
+
+In record mode (``--record``) misses are forwarded to the real APIs with the
+caller's auth headers, and successful responses are saved to the fixtures
+file; keys are never written. In replay mode everything is answered from the
+file, with optional latency, jitter and injected errors (503, or 429 with a
+Retry-After), so the live path can be exercised offline. A request with no
+fixture gets a 404. GET /_stats returns request counters.
+
+    python live_replay.py --record --fixtures live_fixtures.json
+    python live_replay.py --fixtures live_fixtures.json --latency 0.3 --error-rate 0.05
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import requests
+
+LIVE_FIXTURES = os.getenv('LIVE_FIXTURES', 'live_fixtures.json')
+
+UPSTREAMS = {
+    'api-football': 'https://v3.football.api-sports.io',
+    'sofascore': 'https://sofascore.p.rapidapi.com',
+}
+# Request headers passed through to the upstream when recording
+FORWARD_HEADERS = ('x-apisports-key', 'x-rapidapi-key', 'x-rapidapi-host')
+
+
+def fixture_key(provider: str, path: str, params: Dict[str, Any]) -> str:
+    """Fixture lookup key; query parameters are order-insensitive and compared as strings."""
+    query = urlencode(sorted((str(k), str(v)) for k, v in params.items()))
+    return f"{provider} /{path.lstrip('/')}?{query}"
+
+
+def load_fixtures(path: str) -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def synthetic_fixtures(players: Iterable[str], teams: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Small made-up data set covering every request live_api makes for these names.
+
+    Each player is only found on a later league/season probe and each team only
+    has fixtures in 2024, so the fan-out paths do real work.
+    """
+    fixtures: Dict[str, Dict[str, Any]] = {}
+
+    def add(provider: str, path: str, params: Dict[str, Any], response: Any) -> None:
+        fixtures[fixture_key(provider, path, params)] = {
+            'status': 200, 'body': {'results': len(response), 'response': response},
+        }
+
+    for name in players:
+        for season in (2024, 2023):
+            for league in (39, 2, 140, 78, 135, 61):
+                found = season == 2023 and league == 140
+                add('api-football', 'players', {'search': name, 'league': league, 'season': season}, [{
+                    'player': {'name': name.title(), 'nationality': 'Spain', 'age': 24, 'photo': None},
+                    'statistics': [{'team': {'name': 'Replay FC'}, 'league': {'id': league, 'season': season},
+                                    'games': {'appearences': 30, 'minutes': 2400}, 'goals': {'total': 9}}],
+                }] if found else [])
+
+    for team_id, name in enumerate(teams, start=1):
+        add('api-football', 'teams', {'search': name}, [{'team': {'id': team_id, 'name': name.title()}}])
+        for season in (2025, 2024, 2023):
+            add('api-football', 'fixtures', {'team': team_id, 'season': season}, [] if season != 2024 else [{
+                'fixture': {'date': f'2024-{month:02d}-14T19:00:00+00:00', 'status': {'short': 'FT'}},
+                'teams': {'home': {'name': name.title()}, 'away': {'name': f'Opponent {month}'}},
+                'goals': {'home': month % 4, 'away': month % 3},
+            } for month in range(1, 11)])
+
+    add('api-football', 'fixtures', {'live': 'all'}, [{
+        'fixture': {'status': {'short': '2H', 'elapsed': 50 + i}},
+        'teams': {'home': {'name': f'Home {i}'}, 'away': {'name': f'Away {i}'}},
+        'goals': {'home': i, 'away': 1},
+    } for i in range(6)])
+    return fixtures
+
+
+class ReplayServer:
+    """Threaded fixture server; ``record`` forwards misses upstream and saves the answers."""
+
+    def __init__(self, fixtures: Optional[Dict[str, Dict[str, Any]]] = None, fixtures_path: Optional[str] = None,
+                 record: bool = False, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, host: str = '127.0.0.1', port: int = 0, seed: Optional[int] = None):
+        if fixtures is None:
+            fixtures_path = fixtures_path or LIVE_FIXTURES
+            fixtures = load_fixtures(fixtures_path)
+        self.fixtures_path = fixtures_path
+        self.fixtures = dict(fixtures)
+        self.record = record
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'served': 0, 'recorded': 0, 'missing': 0, 'errors': 0}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'ReplayServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='live-replay', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            self._stats[field] += 1
+
+    def _save(self) -> None:
+        if not self.fixtures_path:
+            return
+        tmp = self.fixtures_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.fixtures, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.fixtures_path)
+
+    def _fetch_upstream(self, provider: str, path: str, params: Dict[str, str],
+                        headers: Dict[str, str]) -> Tuple[int, Any]:
+        url = f"{UPSTREAMS[provider].rstrip('/')}/{path.lstrip('/')}"
+        resp = requests.get(url, headers=headers, params=params, timeout=20)
+        try:
+            body = resp.json()
+        except ValueError:
+            body = {'error': resp.text[:500]}
+        # api-football reports quota and parameter problems as 200 + "errors"
+        if resp.status_code == 200 and not (isinstance(body, dict) and body.get('errors')):
+            with self._lock:
+                self.fixtures[fixture_key(provider, path, params)] = {'status': 200, 'body': body}
+                self._stats['recorded'] += 1
+                self._save()
+        return resp.status_code, body
+
+    def respond(self, raw_path: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], Any]:
+        """(status, extra headers, JSON body) for a GET of ``raw_path``."""
+        parsed = urlparse(raw_path)
+        if parsed.path == '/_stats':
+            return 200, {}, self.stats()
+        self._count('requests')
+        provider, _, path = parsed.path.lstrip('/').partition('/')
+        if provider not in UPSTREAMS:
+            return 404, {}, {'error': f'Unknown provider {provider!r}; use /api-football/... or /sofascore/...'}
+        params = dict(parse_qsl(parsed.query, keep_blank_values=True))
+
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self._count('errors')
+            extra = {'Retry-After': '1'} if self.error_status == 429 else {}
+            return self.error_status, extra, {'error': 'injected failure'}
+
+        entry = self.fixtures.get(fixture_key(provider, path, params))
+        if entry is not None:
+            self._count('served')
+            return entry.get('status', 200), {}, entry['body']
+        if self.record:
+            forward = {h: headers[h] for h in FORWARD_HEADERS if h in headers}
+            status, body = self._fetch_upstream(provider, path, params, forward)
+            return status, {}, body
+        self._count('missing')
+        print(f'[live_replay] No fixture for {fixture_key(provider, path, params)}')
+        return 404, {}, {'error': 'no fixture recorded'}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                headers = {k.lower(): v for k, v in self.headers.items()}
+                try:
+                    status, extra, body = server.respond(self.path, headers)
+                except Exception as e:
+                    print(f'[live_replay] Upstream request failed: {e}')
+                    status, extra, body = 502, {}, {'error': str(e)}
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in extra.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--fixtures', default=LIVE_FIXTURES, help='fixtures JSON file (default: %(default)s)')
+    parser.add_argument('--record', action='store_true', help='forward misses upstream and save the responses')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503, help='status for injected errors (503 or 429)')
+    args = parser.parse_args()
+
+    server = ReplayServer(fixtures_path=args.fixtures, record=args.record, latency=args.latency,
+                          jitter=args.jitter, error_rate=args.error_rate, error_status=args.error_status,
+                          host=args.host, port=args.port)
+    mode = 'Recording' if args.record else 'Replaying'
+    print(f'[live_replay] {mode} {len(server.fixtures)} fixtures from {args.fixtures} on {server.url}')
+    print(f'[live_replay] API_FOOTBALL_BASE={server.url}/api-football SOFASCORE_BASE={server.url}/sofascore')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+LLM backends for the chatbot and comparison reports.
+
+Callers use get_client().generate(prompt) or .stream(prompt) instead of
+google.generativeai directly. Set LLM_BACKEND to choose the implementation:
+
+- ``gemini`` (default): Google Gemini, model LLM_MODEL (gemini-2.0-flash).
+- ``stub``: a local deterministic stand-in for offline benchmarks and load
+  tests. It waits LLM_STUB_LATENCY seconds before the first chunk and
+  LLM_STUB_CHUNK_DELAY between chunks, and answers with LLM_STUB_TEMPLATE
+  formatted with {digest}, {prompt_chars} and {question}. A template without
+  placeholders gives a canned reply.
+
+LLM_FALLBACK=stub serves stub replies when the primary backend errors, so the
+app keeps answering while the upstream is degraded. Those replies are
+DegradedText and callers should not cache them.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini').lower()
+LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-2.0-flash')
+LLM_FALLBACK = os.getenv('LLM_FALLBACK', '').lower()
+
+_QUESTION = re.compile(r"USER QUESTION:\s*(.+)")
+
+
+class DegradedText(str):
+    """Reply (or chunk) produced by a fallback backend."""
+
+
+def is_degraded(text: str) -> bool:
+    return isinstance(text, DegradedText)
+
+
+class LLMClient:
+    """Text generation backend. ``name`` identifies it in cache keys."""
+
+    name = 'llm'
+
+    def configured(self) -> bool:
+        """Whether the backend has what it needs (e.g. an API key) to be called."""
+        return True
+
+    def warm(self) -> None:
+        """Load SDKs or models ahead of the first request; a no-op by default."""
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield the reply in chunks; by default one chunk with the whole reply."""
+        yield self.generate(prompt)
+
+
+def _patch_media_resolution(types) -> None:
+    """Work around google-generativeai builds whose GenerationConfig lacks MediaResolution."""
+    try:
+        if not hasattr(types.GenerationConfig, 'MediaResolution'):
+            class MediaResolution:
+                UNSPECIFIED = 0
+                LOW = 1
+                MEDIUM = 2
+                HIGH = 3
+            types.GenerationConfig.MediaResolution = MediaResolution
+    except Exception:
+        pass
+
+
+class GeminiClient(LLMClient):
+    def __init__(self, model_name: str = LLM_MODEL, api_key: Optional[str] = None):
+        self.model_name = model_name
+        self.api_key = api_key if api_key is not None else os.getenv('GOOGLE_API_KEY')
+        self.name = f'gemini:{model_name}'
+        self._model = None
+        self._lock = threading.Lock()
+
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def warm(self) -> None:
+        if self.configured():
+            self._get_model()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                # Imported on first use: the SDK takes about a second to load
+                import google.generativeai as genai
+                _patch_media_resolution(genai.types)
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+            return self._model
+
+    def generate(self, prompt: str) -> str:
+        return self._get_model().generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self._get_model().generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. finish metadata)
+                continue
+            if text:
+                yield text
+
+
+class StubClient(LLMClient):
+    """Deterministic offline backend with configurable latency."""
+
+    name = 'stub'
+
+    def __init__(self, latency: Optional[float] = None, chunk_delay: Optional[float] = None,
+                 template: Optional[str] = None):
+        self.latency = float(os.getenv('LLM_STUB_LATENCY', 0.5)) if latency is None else latency
+        self.chunk_delay = float(os.getenv('LLM_STUB_CHUNK_DELAY', 0.02)) if chunk_delay is None else chunk_delay
+        self.template = template or os.getenv(
+            'LLM_STUB_TEMPLATE',
+            "**Stub reply** `{digest}` to: {question}\n\n"
+            "This answer comes from the local LLM stand-in ({prompt_chars} prompt characters).",
+        )
+
+    def _reply(self, prompt: str) -> str:
+        match = _QUESTION.search(prompt)
+        if match:
+            question = match.group(1).strip()
+        else:
+            lines = prompt.strip().splitlines()
+            question = lines[0][:120] if lines else ''
+        return self.template.format(
+            digest=hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12],
+            prompt_chars=len(prompt),
+            question=question,
+        )
+
+    def _chunks(self, prompt: str):
+        reply = self._reply(prompt)
+        return re.findall(r"\S+\s*|\s+", reply) or [reply]
+
+    def generate(self, prompt: str) -> str:
+        chunks = self._chunks(prompt)
+        time.sleep(self.latency + self.chunk_delay * (len(chunks) - 1))
+        return ''.join(chunks)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        time.sleep(self.latency)
+        for i, chunk in enumerate(self._chunks(prompt)):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield chunk
+
+
+class FallbackClient(LLMClient):
+    """Use ``primary``; when it fails before producing output, answer with ``fallback``."""
+
+    def __init__(self, primary: LLMClient, fallback: LLMClient):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = primary.name
+
+    def configured(self) -> bool:
+        return True
+
+    def warm(self) -> None:
+        self.primary.warm()
+        self.fallback.warm()
+
+    def generate(self, prompt: str) -> str:
+        try:
+            return self.primary.generate(prompt)
+        except Exception as e:
+            print(f"[llm] {self.primary.name} failed ({e}), using {self.fallback.name}")
+            return DegradedText(self.fallback.generate(prompt))
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        started = False
+        try:
+            for chunk in self.primary.stream(prompt):
+                started = True
+                yield chunk
+        except Exception as e:
+            if started:
+                raise
+            print(f"[llm] {self.primary.name} failed ({e}), using {self.fallback.name}")
+            for chunk in self.fallback.stream(prompt):
+                yield DegradedText(chunk)
+
+
+_BACKENDS = {'gemini': GeminiClient, 'stub': StubClient}
+_clients: Dict[str, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def _build(kind: str) -> LLMClient:
+    if kind not in _BACKENDS:
+        print(f"[llm] Unknown LLM_BACKEND '{kind}', using gemini")
+        kind = 'gemini'
+    return _BACKENDS[kind]()
+
+
+def get_client(kind: Optional[str] = None) -> LLMClient:
+    """Process-wide client for ``kind`` (default LLM_BACKEND, wrapped with LLM_FALLBACK if set)."""
+    kind = (kind or LLM_BACKEND).lower()
+    with _clients_lock:
+        client = _clients.get(kind)
+        if client is None:
+            client = _build(kind)
+            if LLM_FALLBACK and LLM_FALLBACK != kind:
+                client = FallbackClient(client, _build(LLM_FALLBACK))
+            _clients[kind] = client
+        return client
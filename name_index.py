@@ -0,0 +1,183 @@
+"""
+In-memory index over normalized (unidecoded, lowercased) player names.
+
+Exact lookups go through a dict; substring lookups intersect character-trigram
+postings and only verify the surviving rows, so resolving a partial name does
+not scan every player. Sorted arrays of full names and of name tokens answer
+prefix queries with two bisections, which is what ranked typeahead search uses.
+FuzzyNameMatcher handles typo-tolerant lookups for the chatbot.
+"""
+import bisect
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+_TOKEN_SPLIT = re.compile(r"[\s\-]+")
+
+
+def _trigrams(text: str) -> List[str]:
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+def _sorted_pairs(pairs: List[Tuple[str, int]]) -> Tuple[List[str], List[int]]:
+    pairs.sort()
+    return [k for k, _ in pairs], [r for _, r in pairs]
+
+
+def _prefix_rows(keys: List[str], rows: List[int], prefix: str) -> List[int]:
+    lo = bisect.bisect_left(keys, prefix)
+    hi = bisect.bisect_left(keys, prefix + "\uffff", lo)
+    return rows[lo:hi]
+
+
+class NameIndex:
+    """Exact and substring lookup over a list of normalized names (row order kept)."""
+
+    def __init__(self, names: Sequence[str]):
+        self.names = [str(n) for n in names]
+        self._exact: Dict[str, int] = {}
+        postings: Dict[str, List[int]] = {}
+        for row, name in enumerate(self.names):
+            self._exact.setdefault(name, row)
+            for gram in set(_trigrams(name)):
+                postings.setdefault(gram, []).append(row)
+        self._postings = {g: np.array(rows, dtype=np.int32) for g, rows in postings.items()}
+        self._prefix_keys, self._prefix_rows = _sorted_pairs([(name, row) for row, name in enumerate(self.names)])
+        self._token_keys, self._token_rows = _sorted_pairs([
+            (token, row) for row, name in enumerate(self.names)
+            for token in set(_TOKEN_SPLIT.split(name)) if token
+        ])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def exact(self, needle: str) -> Optional[int]:
+        """First row whose name equals ``needle``."""
+        return self._exact.get(needle)
+
+    def _trigram_candidates(self, needle: str) -> Optional[np.ndarray]:
+        """Sorted rows containing every trigram of ``needle``; None if it is too short to use."""
+        grams = set(_trigrams(needle))
+        if not grams:
+            return None
+        lists = []
+        for gram in grams:
+            rows = self._postings.get(gram)
+            if rows is None:
+                return np.zeros(0, dtype=np.int32)
+            lists.append(rows)
+        lists.sort(key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+            if len(rows) == 0:
+                break
+        return rows
+
+    def containing(self, needle: str) -> List[int]:
+        """All rows whose name contains ``needle``, in row order."""
+        candidates = self._trigram_candidates(needle)
+        if candidates is None:
+            return [row for row, name in enumerate(self.names) if needle in name]
+        return [int(row) for row in candidates if needle in self.names[row]]
+
+    def first_containing(self, needle: str) -> Optional[int]:
+        """Lowest row whose name contains ``needle``."""
+        candidates = self._trigram_candidates(needle)
+        rows = range(len(self.names)) if candidates is None else candidates
+        for row in rows:
+            if needle in self.names[row]:
+                return int(row)
+        return None
+
+    def search(self, needle: str, limit: int = 20) -> List[int]:
+        """Ranked rows for a typeahead query.
+
+        Exact name first, then names starting with ``needle``, then names with a
+        word starting with it, then any other name containing it; row order
+        within each tier.
+        """
+        if not needle or limit <= 0:
+            return []
+        out: List[int] = []
+        seen = set()
+
+        def _take(rows) -> bool:
+            for row in rows:
+                if row not in seen:
+                    seen.add(row)
+                    out.append(row)
+                    if len(out) >= limit:
+                        return True
+            return False
+
+        exact = self._exact.get(needle)
+        if exact is not None and _take([exact]):
+            return out
+        if _take(sorted(_prefix_rows(self._prefix_keys, self._prefix_rows, needle))):
+            return out
+        if _take(sorted(set(_prefix_rows(self._token_keys, self._token_rows, needle)))):
+            return out
+        _take(self.containing(needle))
+        return out
+
+
+class FuzzyNameMatcher:
+    """Typo-tolerant name matching with the same results as scoring every name.
+
+    SequenceMatcher.quick_ratio (shared character counts) is an upper bound on
+    ratio, and it is computed for all names at once from a per-name character
+    count matrix. Names are then scored with the real ratio, highest bound
+    first, until no remaining bound can reach the current ``limit``-th best
+    score, so the top results always equal a full scan's.
+    """
+
+    def __init__(self, names: Sequence[str]):
+        self.names = [str(n).lower() for n in names]
+        alphabet = sorted({ch for name in self.names for ch in name})
+        self._columns = {ch: i for i, ch in enumerate(alphabet)}
+        self._counts = np.zeros((len(self.names), len(alphabet)), dtype=np.uint16)
+        for row, name in enumerate(self.names):
+            for ch in name:
+                self._counts[row, self._columns[ch]] += 1
+        self._lengths = np.array([len(name) for name in self.names], dtype=np.int32)
+
+    def _bounds(self, q: str) -> np.ndarray:
+        """quick_ratio of every name against ``q``."""
+        query_counts = np.zeros(len(self._columns), dtype=np.uint16)
+        for ch in q:
+            column = self._columns.get(ch)
+            if column is not None:
+                query_counts[column] += 1
+        shared = np.minimum(self._counts, query_counts).sum(axis=1)
+        total = self._lengths + len(q)
+        return np.divide(2.0 * shared, total, out=np.ones(len(total)), where=total > 0)
+
+    def match(self, query: str, limit: int = 5, threshold: float = 0.5) -> List[Tuple[int, float]]:
+        """Up to ``limit`` (row, score) pairs with score > threshold, best first (ties by row)."""
+        if limit <= 0 or not self.names:
+            return []
+        q = str(query).lower()
+        bounds = self._bounds(q)
+        rows = np.flatnonzero(bounds > threshold)
+        rows = rows[np.argsort(-bounds[rows], kind='stable')]
+
+        matcher = SequenceMatcher(None)
+        # Name is the first sequence and the query the second, as in the old
+        # per-row scoring; the second sequence is the one SequenceMatcher caches
+        matcher.set_seq2(q)
+        scored: List[Tuple[int, float]] = []
+        for row in rows:
+            # Ties with the limit-th score still count, since rows break ties
+            if len(scored) >= limit and bounds[row] < scored[limit - 1][1]:
+                break
+            matcher.set_seq1(self.names[row])
+            score = matcher.ratio()
+            if score > threshold:
+                scored.append((int(row), score))
+                scored.sort(key=lambda pair: (-pair[1], pair[0]))
+                del scored[limit:]
+        return scored
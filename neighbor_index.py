@@ -0,0 +1,119 @@
+"""
+Top-k cosine neighbor indexes for the similarity service.
+
+ExactNeighborIndex keeps the L2-normalized feature rows and scores a query
+against every candidate with one matrix-vector product, so memory is O(n*d)
+instead of the O(n^2) of a precomputed similarity matrix. LSHNeighborIndex adds
+random-hyperplane hashing on top to shortlist candidates before exact
+re-ranking. Pick the implementation with SIMILARITY_INDEX=exact|lsh.
+"""
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+SIMILARITY_INDEX = os.getenv('SIMILARITY_INDEX', 'exact').lower()
+
+
+def _normalize_rows(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=float)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    # Zero rows stay zero, matching sklearn's cosine_similarity
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def top_k(candidates: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the k best (candidates, scores), best first, ties in candidate order."""
+    if k <= 0 or len(candidates) == 0:
+        return candidates[:0], scores[:0]
+    if k < len(candidates):
+        keep = np.argpartition(-scores, k - 1)[:k]
+    else:
+        keep = np.arange(len(candidates))
+    order = keep[np.lexsort((keep, -scores[keep]))]
+    return candidates[order], scores[order]
+
+
+class ExactNeighborIndex:
+    """Brute-force cosine top-k over normalized rows."""
+
+    def __init__(self, X: np.ndarray):
+        self.vectors = _normalize_rows(X)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def scores(self, query: int, candidates: np.ndarray) -> np.ndarray:
+        return self.vectors[candidates] @ self.vectors[query]
+
+    def query(self, query: int, k: int, candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows most similar to row ``query``; ``candidates`` (sorted) restricts the search."""
+        if candidates is None:
+            candidates = np.delete(np.arange(len(self)), query)
+        return top_k(candidates, self.scores(query, candidates), k)
+
+    def query_batch(self, queries: np.ndarray, k: int,
+                    candidates: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Exact top-k for several query rows with one matrix multiply; each query excludes itself."""
+        if candidates is None:
+            candidates = np.arange(len(self))
+        scores = self.vectors[queries] @ self.vectors[candidates].T
+        out = []
+        for q, row in zip(queries, scores):
+            keep = candidates != q
+            out.append(top_k(candidates[keep], row[keep], k))
+        return out
+
+
+class LSHNeighborIndex(ExactNeighborIndex):
+    """Random-hyperplane LSH shortlist with exact re-ranking.
+
+    Each of ``n_tables`` tables hashes a row to an ``n_bits`` sign pattern. A
+    query is compared exactly against the rows sharing a bucket with it in any
+    table, falling back to a full scan when that shortlist has fewer than k rows.
+    Batch queries are answered exactly by the inherited query_batch.
+    """
+
+    def __init__(self, X: np.ndarray, n_tables: int = 12, n_bits: int = 10, seed: int = 0):
+        super().__init__(X)
+        rng = np.random.default_rng(seed)
+        dim = self.vectors.shape[1]
+        # Features are min-max scaled (non-negative), so hash the centered
+        # vectors or most hyperplanes would put every row on the same side
+        self._center = self.vectors.mean(axis=0) if len(self) else np.zeros(dim)
+        self._planes = rng.standard_normal((n_tables, dim, n_bits))
+        weights = 1 << np.arange(n_bits, dtype=np.int64)
+        centered = self.vectors - self._center
+        self._codes = np.stack([((centered @ planes) > 0).astype(np.int64) @ weights for planes in self._planes])
+        # Per table: rows sorted by bucket code, for searchsorted lookups
+        self._order = np.argsort(self._codes, axis=1, kind='stable')
+        self._sorted_codes = np.take_along_axis(self._codes, self._order, axis=1)
+
+    def _shortlist(self, query: int) -> np.ndarray:
+        hits = []
+        for t in range(len(self._planes)):
+            code = self._codes[t, query]
+            lo = np.searchsorted(self._sorted_codes[t], code, 'left')
+            hi = np.searchsorted(self._sorted_codes[t], code, 'right')
+            hits.append(self._order[t, lo:hi])
+        return np.unique(np.concatenate(hits)) if hits else np.arange(0)
+
+    def query(self, query: int, k: int, candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        shortlist = self._shortlist(query)
+        if candidates is not None:
+            shortlist = np.intersect1d(shortlist, candidates, assume_unique=True)
+        else:
+            shortlist = shortlist[shortlist != query]
+        if len(shortlist) < k:
+            return super().query(query, k, candidates)
+        return top_k(shortlist, self.scores(query, shortlist), k)
+
+
+def build_index(X: np.ndarray, kind: Optional[str] = None) -> ExactNeighborIndex:
+    kind = (kind or SIMILARITY_INDEX).lower()
+    if kind == 'lsh':
+        return LSHNeighborIndex(X)
+    if kind != 'exact':
+        print(f"[similarity] Unknown SIMILARITY_INDEX '{kind}', using exact")
+    return ExactNeighborIndex(X)
@@ -0,0 +1,93 @@
+"""
+Process-wide player data store.
+
+Loads moneyball_report_outputs/data chatbot.csv once per process and hands the
+same parsed frame to app, chatbot, the RAG service and the similarity service.
+The file's mtime is re-checked at most every RELOAD_CHECK_INTERVAL seconds and
+the frame is reloaded (and derived caches dropped) when the file changes.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+
+CSV_PATH = os.path.join('moneyball_report_outputs', 'data chatbot.csv')
+
+# Seconds between mtime checks; 0 checks on every access.
+RELOAD_CHECK_INTERVAL = float(os.getenv('PLAYER_STORE_RELOAD_INTERVAL', '2'))
+
+_df: Optional[pd.DataFrame] = None
+_mtime: Optional[float] = None
+_version = 0
+_last_check = 0.0
+_derived: Dict[str, Any] = {}
+_lock = threading.RLock()
+
+
+def _read_csv(path: str) -> pd.DataFrame:
+    """Parse the CSV and apply the normalization every consumer relied on."""
+    df = pd.read_csv(path)
+    df.columns = [str(c).strip() for c in df.columns]
+    if 'Player' in df.columns:
+        df['Player'] = df['Player'].astype(str)
+    return df
+
+
+def _refresh(force: bool = False) -> None:
+    """Load the CSV on first use and reload it when its mtime changes."""
+    global _df, _mtime, _version, _last_check
+    now = time.monotonic()
+    if not force and _df is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+        return
+    with _lock:
+        if not force and _df is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+            return
+        _last_check = now
+        try:
+            mtime = os.path.getmtime(CSV_PATH)
+        except OSError:
+            if _df is None:
+                raise FileNotFoundError(f"CSV not found at {CSV_PATH}.")
+            # Keep serving the last good copy if the file disappears mid-deploy
+            return
+        if not force and _df is not None and mtime == _mtime:
+            return
+        df = _read_csv(CSV_PATH)
+        _df = df
+        _mtime = mtime
+        _version += 1
+        _derived.clear()
+        print(f"[player_store] Loaded {len(df)} players (version {_version})")
+
+
+def version() -> int:
+    """Return the current dataset version, reloading first if the file changed."""
+    _refresh()
+    return _version
+
+
+def get_players() -> pd.DataFrame:
+    """Return a shallow view of the shared player frame.
+
+    Adding or replacing columns on the returned frame does not affect other
+    consumers, but cell values must be treated as read-only.
+    """
+    _refresh()
+    return _df.copy(deep=False)
+
+
+def get_derived(name: str, builder: Callable[[pd.DataFrame], Any]) -> Any:
+    """Return ``builder(players)`` cached for the current dataset version."""
+    _refresh()
+    with _lock:
+        if name not in _derived:
+            _derived[name] = builder(_df.copy(deep=False))
+        return _derived[name]
+
+
+def reload() -> int:
+    """Force a reload from disk and return the new version."""
+    _refresh(force=True)
+    return _version
@@ -2,32 +2,175 @@
 Simple Direct Search RAG - Updated for data chatbot.csv
 Searches directly in CSV data using fuzzy matching
 """
-import os
+import numpy as np
 import pandas as pd
-import google.generativeai as genai
 from dotenv import load_dotenv
 from difflib import SequenceMatcher
 
-load_dotenv()
+import llm_client
+import player_store
+from entity_index import EntityIndex, normalize
+from name_index import FuzzyNameMatcher
+from response_cache import ResponseCache, make_key
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+load_dotenv()
 
-# Global data cache
-chatbot_df = None
+# Generated answers, keyed on the normalized question, the players it resolved
+# to, the dataset version and any conversation context.
+# CHATBOT_CACHE_SIZE / CHATBOT_CACHE_TTL (seconds) / CHATBOT_CACHE_DB (SQLite path)
+response_cache = ResponseCache.from_env('chatbot_responses', 'CHATBOT_CACHE', maxsize=512, ttl=6 * 3600)
+
+POSITION_KEYWORDS = ['FW', 'MF', 'DF', 'GK', 'FORWARD', 'MIDFIELDER', 'DEFENDER', 'GOALKEEPER']
+
+# Words that name a value of the Position column in a chatbot message
+POSITION_ALIASES = {
+    'Forward': ['fw', 'forward', 'forwards', 'striker', 'strikers', 'attacker', 'attackers'],
+    'Midfielder': ['mf', 'midfielder', 'midfielders'],
+    'Defender': ['df', 'defender', 'defenders'],
+    'Goalkeeper': ['gk', 'goalkeeper', 'goalkeepers', 'keeper', 'keepers'],
+}
+
+# Common names for teams the data abbreviates
+TEAM_ALIASES = {
+    'Manchester Utd': ['manchester united', 'man utd', 'man united'],
+    'Manchester City': ['man city'],
+    'Newcastle Utd': ['newcastle united', 'newcastle'],
+    "Nott'ham Forest": ['nottingham forest'],
+    'Tottenham': ['tottenham hotspur', 'spurs'],
+    'Paris S-G': ['psg', 'paris saint germain'],
+    'Eint Frankfurt': ['eintracht frankfurt', 'frankfurt'],
+    'Gladbach': ['monchengladbach', 'borussia monchengladbach'],
+    'Dortmund': ['borussia dortmund'],
+    'Bayern Munich': ['bayern'],
+    'Inter': ['inter milan'],
+}
+
+# One-word team names that double as common words only count when capitalised
+TEAM_STOPWORDS = {'angers', 'como', 'inter', 'lens', 'milan', 'nice', 'wolves'}
+
+# Surnames that double as common words in questions are not used as aliases
+SURNAME_STOPWORDS = {'and', 'best', 'can', 'car', 'fee', 'man', 'min', 'new', 'old', 'top', 'young'}
+
+# Everyday words that are also some player's first name or surname; left over
+# in a message they are never looked up as names ("who will win" is not Williams)
+COMMON_WORDS = {
+    'ado', 'amass', 'arp', 'aye', 'banks', 'bell', 'bob', 'bravo', 'burn', 'burns', 'cash', 'chase',
+    'cheek', 'cook', 'dean', 'den', 'der', 'del', 'fort', 'gross', 'hack', 'hall', 'hill', 'horn',
+    'king', 'lees', 'luck', 'machine', 'march', 'mark', 'mount', 'pays', 'pope', 'said', 'sands',
+    'son', 'sow', 'stage', 'stark', 'stones', 'strand', 'tape', 'van', 'warmed', 'white', 'will',
+    'wind', 'winks', 'winter', 'wolf', 'wood',
+}
+
+# At most this many players are added for one left-over name word
+NAME_TOKEN_LIMIT = 5
+
+# Surnames shared by up to this many players name all of them ("Salah");
+# commoner ones ("Garcia") are left to the search_player fallback
+AMBIGUOUS_SURNAME_LIMIT = 3
+
+# Entity column per kind, in the order vocabularies claim aliases
+ENTITY_COLUMNS = {'team': 'Team', 'league': 'league', 'position': 'Position'}
+
+def _vocab(series):
+    """(codes, lowercased distinct values) for keyword matching per distinct value"""
+    codes, uniques = pd.factorize(series.str.lower())
+    return codes, list(uniques)
+
+def _entity_vocabularies(df, player_lower):
+    """{kind: {alias: value}} for teams, leagues, positions and players (tuples of full names)"""
+    vocabularies = {}
+    for kind, column in ENTITY_COLUMNS.items():
+        if column not in df.columns:
+            continue
+        aliases = {}
+        for value in df[column].dropna().astype(str).unique():
+            aliases[value] = value
+            if kind == 'league':
+                # "eng Premier League" is also just "Premier League"
+                code, _, name = value.partition(' ')
+                if name and len(code) <= 3:
+                    aliases[name] = value
+            elif kind == 'team':
+                for alias in TEAM_ALIASES.get(value, []):
+                    aliases[alias] = value
+            elif kind == 'position':
+                for alias in POSITION_ALIASES.get(value, []):
+                    aliases[alias] = value
+        vocabularies[kind] = aliases
+    
+    # Full names, plus surnames that narrow it down to a few players
+    players = {name: (name,) for name in player_lower}
+    by_surname = {}
+    for name in dict.fromkeys(player_lower):
+        by_surname.setdefault(normalize(name).rsplit(' ', 1)[-1], []).append(name)
+    for surname, names in by_surname.items():
+        if len(names) <= AMBIGUOUS_SURNAME_LIMIT and len(surname) >= 3 and surname not in SURNAME_STOPWORDS:
+            # A full name that is just this word keeps its own alias
+            players.setdefault(surname, tuple(names))
+    vocabularies['player'] = players
+    return vocabularies
+
+def _name_token_rows(player_lower):
+    """{first name or surname word: rows} for looking up left-over name words"""
+    rows = {}
+    for row, name in enumerate(player_lower):
+        for token in dict.fromkeys(normalize(name).split()):
+            if len(token) >= 3 and token not in SURNAME_STOPWORDS and token not in COMMON_WORDS:
+                rows.setdefault(token, []).append(row)
+    return rows
+
+def _build_search_state(df):
+    """Precompute everything search needs; the result is never mutated"""
+    print("[RAG] Loading chatbot data...")
+    player_lower = df['Player'].astype(str).str.lower().tolist()
+    exact_rows = {}
+    for row, name in enumerate(player_lower):
+        exact_rows.setdefault(name, []).append(row)
+    
+    undervalued_order = np.zeros(0, dtype=int)
+    if 'Undervaluation' in df.columns:
+        # Non-numeric values such as "Not Available" are dropped
+        undervaluation = pd.to_numeric(df['Undervaluation'], errors='coerce').to_numpy()
+        ranked = np.flatnonzero(~np.isnan(undervaluation))
+        undervalued_order = ranked[np.argsort(-undervaluation[ranked], kind='stable')]
+    
+    state = {
+        'df': df,
+        'player_lower': player_lower,
+        'exact_rows': exact_rows,
+        'fuzzy': FuzzyNameMatcher(player_lower),
+        'undervalued_order': undervalued_order,
+        'entities': EntityIndex(_entity_vocabularies(df, player_lower), cased=TEAM_STOPWORDS),
+        'name_token_rows': _name_token_rows(player_lower),
+        'entity_rows': {
+            kind: {str(k): v for k, v in df.reset_index(drop=True).groupby(column, sort=False).indices.items()}
+            for kind, column in ENTITY_COLUMNS.items() if column in df.columns
+        },
+        'position': _vocab(df['Position'].astype('string')) if 'Position' in df.columns else None,
+        'team': _vocab(df['Team'].astype('string')) if 'Team' in df.columns else None,
+    }
+    print(f"[RAG] Loaded {len(df)} players from data chatbot.csv")
+    print(f"[RAG] Columns: {list(df.columns)}")
+    return state
 
 def load_data():
-    """Load chatbot CSV file into memory"""
-    global chatbot_df
-    
-    if chatbot_df is None:
-        print("[RAG] Loading chatbot data...")
-        try:
-            chatbot_df = pd.read_csv('moneyball_report_outputs/data chatbot.csv')
-            print(f"[RAG] Loaded {len(chatbot_df)} players from data chatbot.csv")
-            print(f"[RAG] Columns: {list(chatbot_df.columns)}")
-        except Exception as e:
-            print(f"[RAG] Error loading data: {e}")
+    """Return the immutable search state for the current dataset version"""
+    try:
+        return player_store.get_derived('rag_search', _build_search_state)
+    except Exception as e:
+        print(f"[RAG] Error loading data: {e}")
+        return None
+
+def _records(state, rows):
+    return state['df'].iloc[list(rows)].to_dict('records')
+
+def _keyword_rows(vocab, keyword, limit=10):
+    """First rows whose lowercased value contains keyword"""
+    if vocab is None:
+        return []
+    codes, values = vocab
+    hits = [i for i, v in enumerate(values) if keyword in v]
+    return np.flatnonzero(np.isin(codes, hits))[:limit].tolist()
 
 def fuzzy_match_score(str1, str2):
     """Calculate fuzzy match score between two strings"""
@@ -35,51 +178,105 @@ def fuzzy_match_score(str1, str2):
 
 def search_player(query):
     """Search for a player by name using fuzzy matching"""
-    global chatbot_df
-    
-    load_data()
+    state = load_data()
     
-    if chatbot_df is None:
+    if state is None:
         return []
     
     query_lower = query.lower()
     print(f"[RAG] Searching for: '{query}'")
     
     # Try exact match first
-    exact_matches = chatbot_df[chatbot_df['Player'].str.lower() == query_lower]
-    if not exact_matches.empty:
-        print(f"[RAG] Found exact match: {exact_matches.iloc[0]['Player']}")
-        return exact_matches.to_dict('records')
+    exact_rows = state['exact_rows'].get(query_lower)
+    if exact_rows:
+        exact_matches = _records(state, exact_rows)
+        print(f"[RAG] Found exact match: {exact_matches[0]['Player']}")
+        return exact_matches
     
     # Try substring match
-    substring_matches = chatbot_df[chatbot_df['Player'].str.contains(query, case=False, na=False)]
-    if not substring_matches.empty:
-        print(f"[RAG] Found {len(substring_matches)} substring matches")
-        return substring_matches.to_dict('records')[:5]
-    
-    # Fuzzy match
-    chatbot_df['match_score'] = chatbot_df['Player'].apply(
-        lambda x: fuzzy_match_score(str(x), query) if pd.notna(x) else 0
-    )
+    substring_rows = [row for row, name in enumerate(state['player_lower']) if query_lower in name]
+    if substring_rows:
+        print(f"[RAG] Found {len(substring_rows)} substring matches")
+        return _records(state, substring_rows[:5])
     
-    fuzzy_matches = chatbot_df[chatbot_df['match_score'] > 0.5].sort_values('match_score', ascending=False).head(5)
+    # Fuzzy match, pruned by an upper bound on the score; scores live only in this request
+    fuzzy = state['fuzzy'].match(query, limit=5, threshold=0.5)
     
-    if not fuzzy_matches.empty:
+    if fuzzy:
+        fuzzy_matches = _records(state, [row for row, _ in fuzzy])
         print(f"[RAG] Found {len(fuzzy_matches)} fuzzy matches")
-        for idx, row in fuzzy_matches.iterrows():
-            print(f"  - {row['Player']} (score: {row['match_score']:.2f})")
-        return fuzzy_matches.to_dict('records')
+        for record, (_, score) in zip(fuzzy_matches, fuzzy):
+            record['match_score'] = score
+            print(f"  - {record['Player']} (score: {score:.2f})")
+        return fuzzy_matches
     
     print("[RAG] No matches found")
     return []
 
+def search_entities(query, limit=10):
+    """Look up the players, teams, leagues and positions named in query.
+    
+    Mentioned players are returned directly. This includes every candidate
+    for a surname that several players share, and the players whose first
+    name or surname exactly matches any other name word left in the query,
+    so a comparison never loses a side.
+    Otherwise up to limit players matching every mentioned kind of filter
+    (any of several teams, say) are returned, most undervalued first when
+    the query asks for undervalued players.
+    """
+    state = load_data()
+    
+    if state is None:
+        return []
+    
+    mentions = state['entities'].mentions(query)
+    if not mentions:
+        return []
+    entities = list(dict.fromkeys((kind, value) for _, _, kind, value in mentions))
+    print(f"[RAG] Entities: {entities}")
+    
+    player_names = dict.fromkeys(name for kind, names in entities if kind == 'player' for name in names)
+    if player_names:
+        records = _records(state, [row for name in player_names for row in state['exact_rows'][name]])
+        print(f"[RAG] Found {len(records)} mentioned players")
+        # Name words no alias claimed, e.g. a surname too common to resolve
+        text = list(normalize(query))
+        for start, end, _, _ in mentions:
+            text[start:end] = ' ' * (end - start)
+        seen = set(player_names)
+        extra_rows = []
+        for token in dict.fromkeys(''.join(text).split()):
+            for row in state['name_token_rows'].get(token, [])[:NAME_TOKEN_LIMIT]:
+                if state['player_lower'][row] not in seen:
+                    seen.add(state['player_lower'][row])
+                    extra_rows.append(row)
+        if extra_rows:
+            print(f"[RAG] Added {len(extra_rows)} players for other name words")
+            records.extend(_records(state, extra_rows))
+        return records
+    
+    mask = np.ones(len(state['df']), dtype=bool)
+    for kind, rows_by_value in state['entity_rows'].items():
+        values = [value for k, value in entities if k == kind]
+        if values:
+            kind_mask = np.zeros(len(mask), dtype=bool)
+            for value in values:
+                kind_mask[rows_by_value[value]] = True
+            mask &= kind_mask
+    
+    query_lower = query.lower()
+    if 'undervalued' in query_lower or 'undervalue' in query_lower:
+        rows = state['undervalued_order'][mask[state['undervalued_order']]][:limit]
+    else:
+        rows = np.flatnonzero(mask)[:limit]
+    print(f"[RAG] Found {len(rows)} players by filters")
+    return _records(state, rows)
+
 def search_general(query):
     """Search for general queries"""
-    global chatbot_df
+    state = load_data()
     
-    load_data()
-    
-    if chatbot_df is None:
+    if state is None:
         return []
     
     query_lower = query.lower()
@@ -87,31 +284,28 @@ def search_general(query):
     
     print(f"[RAG] General search for: '{query}'")
     
-    # Search for undervalued players
+    # Search for undervalued players (ranking precomputed at load)
     if 'undervalued' in query_lower or 'undervalue' in query_lower:
-        if chatbot_df is not None and 'Undervaluation' in chatbot_df.columns:
-            # Filter out non-numeric values
-            chatbot_df['Undervaluation_numeric'] = pd.to_numeric(chatbot_df['Undervaluation'], errors='coerce')
-            top_undervalued = chatbot_df[chatbot_df['Undervaluation_numeric'].notna()].sort_values('Undervaluation_numeric', ascending=False).head(10)
+        if len(state['undervalued_order']):
             print(f"[RAG] Found top 10 undervalued players")
-            return top_undervalued.to_dict('records')
+            return _records(state, state['undervalued_order'][:10])
     
     # Search by position
     for keyword in keywords:
-        if keyword.upper() in ['FW', 'MF', 'DF', 'GK', 'FORWARD', 'MIDFIELDER', 'DEFENDER', 'GOALKEEPER']:
-            if 'Position' in chatbot_df.columns:
-                pos_matches = chatbot_df[chatbot_df['Position'].str.contains(keyword, case=False, na=False)].head(10)
-                if not pos_matches.empty:
-                    print(f"[RAG] Found {len(pos_matches)} players by position")
-                    return pos_matches.to_dict('records')
+        if keyword.upper() in POSITION_KEYWORDS:
+            pos_rows = _keyword_rows(state['position'], keyword)
+            if pos_rows:
+                print(f"[RAG] Found {len(pos_rows)} players by position")
+                return _records(state, pos_rows)
     
     # Search by team
-    if 'Team' in chatbot_df.columns:
-        for keyword in keywords:
-            team_matches = chatbot_df[chatbot_df['Team'].str.contains(keyword, case=False, na=False)].head(10)
-            if not team_matches.empty:
-                print(f"[RAG] Found {len(team_matches)} players by team")
-                return team_matches.to_dict('records')
+    for word, keyword in zip(query.split(), keywords):
+        if normalize(keyword) in TEAM_STOPWORDS and not word[:1].isupper():
+            continue
+        team_rows = _keyword_rows(state['team'], keyword)
+        if team_rows:
+            print(f"[RAG] Found {len(team_rows)} players by team")
+            return _records(state, team_rows)
     
     return []
 
@@ -195,19 +389,22 @@ def format_player_context(players_data):
     
     return "\n\n".join(context_parts)
 
-def get_rag_response(query, history=None):
-    """Get RAG response with enhanced prompts and conversation history"""
-    try:
-        print(f"\n[RAG] Processing query: '{query}'")
-        
-        # Check for greetings and common questions
-        query_lower = query.lower().strip()
-        greetings = ['hi', 'hai', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening', 'hola', 'greetings']
-        help_words = ['help', 'what can you do', 'how do you work', 'what do you do', 'commands']
-        
-        # Greeting response
-        if any(greeting in query_lower for greeting in greetings) and len(query_lower) < 20:
-            return """Hey there! 👋 Welcome to ScoutX Football Analytics!
+def prepare_rag_response(query, history=None):
+    """Retrieve context and build the prompt for query.
+    
+    Returns {'reply': text} when no model call is needed (greetings, help, no
+    results, cached answers), otherwise {'prompt': ..., 'cache_key': ...}.
+    """
+    print(f"\n[RAG] Processing query: '{query}'")
+    
+    # Check for greetings and common questions
+    query_lower = query.lower().strip()
+    greetings = ['hi', 'hai', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening', 'hola', 'greetings']
+    help_words = ['help', 'what can you do', 'how do you work', 'what do you do', 'commands']
+    
+    # Greeting response
+    if any(greeting in query_lower for greeting in greetings) and len(query_lower) < 20:
+        return {'reply': """Hey there! 👋 Welcome to ScoutX Football Analytics!
 
 I'm here to help you discover amazing football players and insights! Here's what I can do:
 
@@ -229,11 +426,11 @@ I'm here to help you discover amazing football players and insights! Here's what
 
 **Just ask me anything about football players, and I'll help you out! 😊**
 
-Try asking: "Who is Erling Haaland?" or "Best young midfielders" 🚀"""
-        
-        # Help response
-        if any(word in query_lower for word in help_words):
-            return """**Here's how I can help you! 🤝**
+Try asking: "Who is Erling Haaland?" or "Best young midfielders" 🚀"""}
+    
+    # Help response
+    if any(word in query_lower for word in help_words):
+        return {'reply': """**Here's how I can help you! 🤝**
 
 📊 **What I Know:**
 - Detailed stats for 2,699+ players
@@ -254,32 +451,33 @@ Try asking: "Who is Erling Haaland?" or "Best young midfielders" 🚀"""
 - "Best young wingers"
 - "Undervalued players in La Liga"
 
-Ready to discover some amazing talent? Just ask away! ⚽✨"""
-        
+Ready to discover some amazing talent? Just ask away! ⚽✨"""}
+    
+    results = search_entities(query)
+    
+    if not results:
         results = search_player(query)
+    
+    if not results:
+        results = search_general(query)
+    
+    if not results:
+        return {'reply': "I couldn't find any relevant information. Try asking about specific players, teams, or use keywords like 'undervalued players'."}
+    
+    context = format_player_context(results)
+    print(f"[RAG] Found {len(results)} results")
+    
+    is_single_player = len(results) == 1
+    
+    if is_single_player:
+        # Add conversation history if available
+        history_context = ""
+        if history and len(history) > 0:
+            history_context = "\nPrevious conversation context:\n"
+            for h in history[-3:]:  # Last 3 exchanges
+                history_context += f"User: {h['user']}\nAssistant: {h['assistant'][:150]}...\n"
         
-        if not results:
-            results = search_general(query)
-        
-        if not results:
-            return "I couldn't find any relevant information. Try asking about specific players, teams, or use keywords like 'undervalued players'."
-        
-        context = format_player_context(results)
-        print(f"[RAG] Found {len(results)} results")
-        
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        
-        is_single_player = len(results) == 1
-        
-        if is_single_player:
-            # Add conversation history if available
-            history_context = ""
-            if history and len(history) > 0:
-                history_context = "\nPrevious conversation context:\n"
-                for h in history[-3:]:  # Last 3 exchanges
-                    history_context += f"User: {h['user']}\nAssistant: {h['assistant'][:150]}...\n"
-            
-            prompt = f"""You are a friendly football analytics expert who loves helping people discover amazing players! 😊 Create an engaging and informative player report.
+        prompt = f"""You are a friendly football analytics expert who loves helping people discover amazing players! 😊 Create an engaging and informative player report.
 {history_context}
 PLAYER DATA:
 {context}
@@ -308,15 +506,15 @@ Generate a detailed, professional player report:
 
 Use emojis and clear formatting. Be friendly, enthusiastic, and conversational while staying informative! 🚀"""
 
-        else:
-            # Add conversation history if available
-            history_context = ""
-            if history and len(history) > 0:
-                history_context = "\nPrevious conversation context:\n"
-                for h in history[-3:]:  # Last 3 exchanges
-                    history_context += f"User: {h['user']}\nAssistant: {h['assistant'][:150]}...\n"
-            
-            prompt = f"""You are a friendly football analytics expert who makes player comparisons fun and insightful! 😊
+    else:
+        # Add conversation history if available
+        history_context = ""
+        if history and len(history) > 0:
+            history_context = "\nPrevious conversation context:\n"
+            for h in history[-3:]:  # Last 3 exchanges
+                history_context += f"User: {h['user']}\nAssistant: {h['assistant'][:150]}...\n"
+        
+        prompt = f"""You are a friendly football analytics expert who makes player comparisons fun and insightful! 😊
 {history_context}
 PLAYERS DATA:
 {context}
@@ -331,9 +529,32 @@ Provide a clear, organized response:
 
 Make it engaging and friendly - like chatting with a knowledgeable friend! Use emojis and keep it fun! 🤝"""
 
-        response = model.generate_content(prompt)
+    cache_key = make_key(
+        llm_client.get_client().name,
+        normalize(query),
+        sorted(str(p.get('Player')) for p in results),
+        player_store.version(),
+        history_context,
+    )
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        print(f"[RAG] Response served from cache")
+        return {'reply': cached}
+    
+    return {'prompt': prompt, 'cache_key': cache_key}
+
+def get_rag_response(query, history=None):
+    """Get RAG response with enhanced prompts and conversation history"""
+    try:
+        prepared = prepare_rag_response(query, history)
+        if 'reply' in prepared:
+            return prepared['reply']
+        
+        text = llm_client.get_client().generate(prepared['prompt'])
         print(f"[RAG] Response generated")
-        return response.text
+        if not llm_client.is_degraded(text):
+            response_cache.set(prepared['cache_key'], text)
+        return text
         
     except Exception as e:
         print(f"[RAG] Error: {e}")
@@ -341,5 +562,17 @@ Make it engaging and friendly - like chatting with a knowledgeable friend! Use e
         traceback.print_exc()
         return f"Sorry, an error occurred: {str(e)}"
 
-# Pre-load data
-load_data()
+def stream_rag_response(prepared):
+    """Yield the answer for a prepare_rag_response result in chunks as the model generates it"""
+    if 'reply' in prepared:
+        yield prepared['reply']
+        return
+    
+    parts = []
+    for chunk in llm_client.get_client().stream(prepared['prompt']):
+        parts.append(chunk)
+        yield chunk
+    print(f"[RAG] Response streamed")
+    # Only complete answers are cached; an abandoned stream never gets here
+    if not any(llm_client.is_degraded(part) for part in parts):
+        response_cache.set(prepared['cache_key'], ''.join(parts))
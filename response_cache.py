@@ -0,0 +1,179 @@
+"""
+Cache for generated (LLM) responses.
+
+An in-memory LRU with per-entry TTL answers repeats in microseconds; an
+optional SQLite file behind it keeps answers across restarts and workers.
+Values must be JSON-serializable. The cache is best-effort: a disk error is
+logged and treated as a miss. SingleFlight collapses concurrent identical
+calls so a cold key costs one model call, not one per waiting request.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+_MISSING = object()
+
+
+def make_key(*parts: Any) -> str:
+    """Stable hex digest of JSON-serializable key parts."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """LRU/TTL memory cache with an optional SQLite tier.
+
+    ``db_path`` of None (or empty) keeps everything in memory. Several caches
+    can share one database file; ``name`` selects the table.
+    """
+
+    def __init__(self, name: str, maxsize: int = 512, ttl: float = 3600.0, db_path: Optional[str] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.db_path = db_path or None
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        f'CREATE TABLE IF NOT EXISTS "{self.name}" '
+                        '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)'
+                    )
+            except sqlite3.Error as e:
+                print(f"[cache] Disabling SQLite tier for {self.name}: {e}")
+                self.db_path = None
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, maxsize: int = 512, ttl: float = 3600.0) -> 'ResponseCache':
+        """Build from ``<prefix>_SIZE``, ``<prefix>_TTL`` and ``<prefix>_DB`` environment variables."""
+        return cls(
+            name,
+            maxsize=int(os.getenv(f'{prefix}_SIZE', maxsize)),
+            ttl=float(os.getenv(f'{prefix}_TTL', ttl)),
+            db_path=os.getenv(f'{prefix}_DB'),
+        )
+
+    @contextmanager
+    def _connect(self):
+        """Connection that commits on success and is always closed."""
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, key: str, expires: float, value: Any) -> None:
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._remember(key, value[0], value[1])
+        return value[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store value for ``ttl`` seconds (the cache's default TTL when None)."""
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires, value)
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        f'INSERT OR REPLACE INTO "{self.name}" (key, value, expires) VALUES (?, ?, ?)',
+                        (key, json.dumps(value), expires),
+                    )
+                    # Writes follow an LLM call, so a scan for expired rows is cheap by comparison
+                    conn.execute(f'DELETE FROM "{self.name}" WHERE expires <= ?', (time.time(),))
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                print(f"[cache] SQLite write failed for {self.name}: {e}")
+
+    def _disk_get(self, key: str, now: float):
+        if not self.db_path:
+            return _MISSING
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f'SELECT value, expires FROM "{self.name}" WHERE key = ?', (key,)
+                ).fetchone()
+                if row is None:
+                    return _MISSING
+                if row[1] <= now:
+                    conn.execute(f'DELETE FROM "{self.name}" WHERE key = ?', (key,))
+                    return _MISSING
+                return row[1], json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[cache] SQLite read failed for {self.name}: {e}")
+            return _MISSING
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute(f'DELETE FROM "{self.name}"')
+            except sqlite3.Error as e:
+                print(f"[cache] SQLite clear failed for {self.name}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'ttl': self.ttl, 'sqlite': bool(self.db_path)}
+
+
+class SingleFlight:
+    """At most one in-flight call per key; concurrent callers share its result or exception."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
@@ -1,14 +1,19 @@
-import os
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any, Optional
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 import unidecode
 import threading
 
+import player_store
+from name_index import NameIndex
+from neighbor_index import build_index
+
+if TYPE_CHECKING:
+    # sklearn is imported on first load; it adds about a second to startup
+    from sklearn.preprocessing import MinMaxScaler
+
 # Path to the user's CSV
-CSV_PATH = os.path.join('moneyball_report_outputs', 'data chatbot.csv')
+CSV_PATH = player_store.CSV_PATH
 
 # Feature definitions (Reference Repo)
 ATTACKER_FEATURES = [
@@ -148,15 +153,19 @@ FEATURE_DESCRIPTIONS = {
     # Add more as needed
 }
 
-_df_players: Optional[pd.DataFrame] = None
+# Everything derived from one dataset version, built in full and then swapped
+# in with a single assignment, so readers never mix two versions. Keys:
+#   df, version
+#   pos_scalers, pos_feature_cols, pos_index_to_group_index,
+#   pos_group_matrices, pos_indexes, pos_group_rows   (per position group)
+#   filter_layer: numeric ages plus (codes, lowercased vocabulary) for Comp,
+#     Squad and Pos, for the get_similar_players filters
+#   radar_labels, radar_raw, radar_values: RADAR_CATEGORIES_DEFAULT per row,
+#     raw and 0-1 scaled
+#   rk_to_row (Rk -> first row), name_index, search_labels
+_state: Optional[Dict[str, Any]] = None
 _lock = threading.Lock()
 
-_pos_scalers: Dict[str, MinMaxScaler] = {}
-_pos_feature_cols: Dict[str, List[str]] = {}
-_pos_index_to_group_index: Dict[str, Dict[int, int]] = {}
-_pos_group_matrices: Dict[str, np.ndarray] = {}
-_pos_similarity: Dict[str, np.ndarray] = {}
-
 def map_position_by_first(pos_raw: Any) -> str:
     if not isinstance(pos_raw, str):
         return "midfielder"
@@ -170,22 +179,70 @@ def map_position_by_first(pos_raw: Any) -> str:
     if "DF" in pos_raw: return "defender"
     return "midfielder"
 
-def _ensure_loaded():
-    global _df_players, _pos_scalers, _pos_feature_cols, _pos_group_matrices, _pos_similarity, _pos_index_to_group_index
+def _build_filter_layer(df: pd.DataFrame) -> Dict[str, Any]:
+    n = len(df)
+    layer = {"age": pd.to_numeric(df["Age"], errors="coerce").to_numpy(dtype=float) if "Age" in df.columns else np.zeros(n)}
+    for col in ("Comp", "Squad", "Pos"):
+        values = df[col].astype(str).str.lower() if col in df.columns else pd.Series([""] * n)
+        codes, vocab = pd.factorize(values)
+        layer[col] = (codes, list(vocab))
+    return layer
+
+def _build_radar_table(df: pd.DataFrame, scalers: Dict[str, Optional['MinMaxScaler']],
+                       feature_cols: Dict[str, List[str]]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Scale the default radar categories for every row at once.
+
+    A label is scaled with the player's position-group scaler when it is one of
+    the group's features, otherwise with the column's min/max over all players.
+    """
+    labels = [c for c in RADAR_CATEGORIES_DEFAULT if c in df.columns]
+    n = len(df)
+    raw = np.zeros((n, len(labels)))
+    lo = np.zeros((n, len(labels)))
+    hi = np.ones((n, len(labels)))
+    for j, label in enumerate(labels):
+        raw[:, j] = pd.to_numeric(df[label], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+        try:
+            lo[:, j] = float(df[label].min()); hi[:, j] = float(df[label].max())
+        except Exception:
+            lo[:, j] = raw[:, j].min() if n else 0.0; hi[:, j] = raw[:, j].max() if n else 1.0
+    groups = df['PositionGroup'].to_numpy()
+    for group, scaler in scalers.items():
+        if scaler is None: continue
+        rows = groups == group
+        cols = feature_cols.get(group, [])
+        for j, label in enumerate(labels):
+            if label in cols:
+                idx = cols.index(label)
+                lo[rows, j] = float(scaler.data_min_[idx]); hi[rows, j] = float(scaler.data_max_[idx])
+    span = hi - lo
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled = np.where(span == 0, 0.0, (raw - lo) / np.where(span == 0, 1.0, span))
+    values = np.round(np.clip(scaled, 0.0, 1.0), 4).astype(np.float32)
+    return labels, raw, values
+
+def _ensure_loaded() -> Dict[str, Any]:
+    """Current state, rebuilt when the player store has a new version."""
+    global _state
+    version = player_store.version()
+    state = _state
+    if state is not None and state['version'] == version:
+        return state
     with _lock:
-        if _df_players is not None: return
-        if not os.path.exists(CSV_PATH):
-            raise FileNotFoundError(f"CSV not found at {CSV_PATH}.")
-        
-        df = pd.read_csv(CSV_PATH)
+        if _state is not None and _state['version'] == version:
+            return _state
+        from sklearn.preprocessing import MinMaxScaler
+
+        df = player_store.get_players()
         
         # Rename columns based on mapping
         # Invert mapping to rename User -> Reference
         rename_map = {v: k for k, v in COLUMN_MAPPING.items() if v in df.columns}
-        df.rename(columns=rename_map, inplace=True)
+        df = df.rename(columns=rename_map)
         
         df.columns = [c.strip() for c in df.columns]
-        df.fillna(0, inplace=True)
+        # Not in place: the shared store frame must stay untouched
+        df = df.fillna(0)
         df['PlayerNormalized'] = df['Player'].astype(str).apply(lambda s: unidecode.unidecode(s).lower())
         
         if 'Rk' not in df.columns:
@@ -197,24 +254,26 @@ def _ensure_loaded():
                 df['Rk'] = pd.to_numeric(df['Rk'], errors='coerce').fillna(-1).astype(int)
         
         df['PositionGroup'] = df['Pos'].apply(map_position_by_first)
-        _df_players = df
         
+        # Build into fresh dicts; readers holding the old state keep using it
+        scalers, feature_cols, index_maps, matrices, indexes = {}, {}, {}, {}, {}
+        group_rows = {group: np.zeros(0, dtype=np.int64) for group in ALL_FEATURES_BY_POSITION}
         for group, feature_list in ALL_FEATURES_BY_POSITION.items():
             existing = [f for f in feature_list if f in df.columns]
-            _pos_feature_cols[group] = existing
+            feature_cols[group] = existing
             if len(existing) == 0:
-                _pos_scalers[group] = None
-                _pos_group_matrices[group] = np.zeros((0, 0))
-                _pos_similarity[group] = np.zeros((0, 0))
-                _pos_index_to_group_index[group] = {}
+                scalers[group] = None
+                matrices[group] = np.zeros((0, 0))
+                indexes[group] = None
+                index_maps[group] = {}
                 continue
             
             group_indices = df.index[df['PositionGroup'] == group].tolist()
             if len(group_indices) == 0:
-                _pos_scalers[group] = None
-                _pos_group_matrices[group] = np.zeros((0, len(existing)))
-                _pos_similarity[group] = np.zeros((0, 0))
-                _pos_index_to_group_index[group] = {}
+                scalers[group] = None
+                matrices[group] = np.zeros((0, len(existing)))
+                indexes[group] = None
+                index_maps[group] = {}
                 continue
                 
             X = df.loc[group_indices, existing].copy()
@@ -223,17 +282,37 @@ def _ensure_loaded():
             
             scaler = MinMaxScaler()
             X_scaled = scaler.fit_transform(X.values)
-            _pos_scalers[group] = scaler
-            _pos_group_matrices[group] = X_scaled
-            
-            if X_scaled.shape[0] > 1:
-                sim = cosine_similarity(X_scaled)
-            else:
-                sim = np.zeros((X_scaled.shape[0], X_scaled.shape[0]))
-            _pos_similarity[group] = sim
+            scalers[group] = scaler
+            matrices[group] = X_scaled
+            # Neighbours are scored on demand instead of via a dense N x N matrix
+            indexes[group] = build_index(X_scaled)
             
             mapping = {int(idx): i for i, idx in enumerate(group_indices)}
-            _pos_index_to_group_index[group] = mapping
+            index_maps[group] = mapping
+            group_rows[group] = np.array(group_indices, dtype=np.int64)
+        
+        radar_labels, radar_raw, radar_values = _build_radar_table(df, scalers, feature_cols)
+        rk_to_row = {}
+        for row, rk in enumerate(df['Rk'].tolist()):
+            rk_to_row.setdefault(int(rk), row)
+        _state = {
+            'df': df,
+            'version': version,
+            'pos_scalers': scalers,
+            'pos_feature_cols': feature_cols,
+            'pos_index_to_group_index': index_maps,
+            'pos_group_matrices': matrices,
+            'pos_indexes': indexes,
+            'pos_group_rows': group_rows,
+            'filter_layer': _build_filter_layer(df),
+            'radar_labels': radar_labels,
+            'radar_raw': radar_raw,
+            'radar_values': radar_values,
+            'rk_to_row': rk_to_row,
+            'name_index': NameIndex(df['PlayerNormalized'].tolist()),
+            'search_labels': ([int(rk) for rk in df['Rk'].tolist()], df['Player'].tolist()),
+        }
+        return _state
 
 def clean(obj):
     if isinstance(obj, dict): return {k: clean(v) for k, v in obj.items()}
@@ -245,30 +324,32 @@ def clean(obj):
     return obj
 
 def load_players_df() -> pd.DataFrame:
-    _ensure_loaded()
-    return _df_players.copy()
+    return _ensure_loaded()['df'].copy()
 
 def search_players(q: str, rows: int = 20) -> List[Dict[str, Any]]:
-    _ensure_loaded()
+    state = _ensure_loaded()
     if not q: return []
     qnorm = unidecode.unidecode(q).lower()
-    df = _df_players[_df_players['PlayerNormalized'].str.contains(qnorm, na=False)]
-    df = df.head(rows)
-    return [{"player_id": int(r['Rk']), "player_name": r['Player']} for _, r in df.iterrows()]
+    rk, names = state['search_labels']
+    return [{"player_id": rk[i], "player_name": names[i]} for i in state['name_index'].search(qnorm, rows)]
 
-def get_player_by_name_or_id(player_identifier: str) -> Optional[Dict[str, Any]]:
-    _ensure_loaded()
-    df = _df_players
-    row = pd.DataFrame()
+def _resolve_row(state: Dict[str, Any], player_identifier: Any) -> Optional[int]:
+    """Resolve an Rk or a (partial) player name to a row position in O(1) for ids and exact names."""
     try:
-        pid = int(player_identifier); row = df.loc[df['Rk'] == pid]
+        pid = int(player_identifier)
     except Exception:
         needle = unidecode.unidecode(str(player_identifier)).lower()
-        row = df[df['PlayerNormalized'] == needle]
-        if row.empty:
-            row = df[df['PlayerNormalized'].str.contains(needle, na=False)]
-    if row.empty: return None
-    r = row.iloc[0].to_dict()
+        row = state['name_index'].exact(needle)
+        if row is None:
+            row = state['name_index'].first_containing(needle)
+        return row
+    return state['rk_to_row'].get(pid)
+
+def get_player_by_name_or_id(player_identifier: str) -> Optional[Dict[str, Any]]:
+    state = _ensure_loaded()
+    row_index = _resolve_row(state, player_identifier)
+    if row_index is None: return None
+    r = state['df'].iloc[row_index].to_dict()
     out = {}
     for k, v in r.items():
         if isinstance(v, (np.integer,)): out[k] = int(v)
@@ -276,10 +357,12 @@ def get_player_by_name_or_id(player_identifier: str) -> Optional[Dict[str, Any]]
         else: out[k] = v
     return out
 
-def _build_radar_for_player_row(row_index: int, category_labels: List[str]) -> Dict[str, Any]:
-    _ensure_loaded()
-    df = _df_players
+def _build_radar_for_player_row(state: Dict[str, Any], row_index: int, category_labels: List[str]) -> Dict[str, Any]:
+    df = state['df']
     if row_index not in df.index: raise ValueError(f"Row index {row_index} not found")
+    if list(category_labels) == RADAR_CATEGORIES_DEFAULT:
+        # Served from the table built at load time
+        return {"labels": list(state['radar_labels']), "values": [round(float(v), 4) for v in state['radar_values'][row_index]]}
     row = df.loc[row_index]
     player_pos_group = row['PositionGroup']
     labels = [c for c in category_labels if c in df.columns]
@@ -289,9 +372,9 @@ def _build_radar_for_player_row(row_index: int, category_labels: List[str]) -> D
         try: raw = float(row.get(label, 0.0))
         except Exception: raw = 0.0
         
-        pos_cols = _pos_feature_cols.get(player_pos_group, [])
-        if label in pos_cols and _pos_scalers.get(player_pos_group) is not None:
-            idx = pos_cols.index(label); scaler = _pos_scalers[player_pos_group]
+        pos_cols = state['pos_feature_cols'].get(player_pos_group, [])
+        if label in pos_cols and state['pos_scalers'].get(player_pos_group) is not None:
+            idx = pos_cols.index(label); scaler = state['pos_scalers'][player_pos_group]
             try:
                 minv = float(scaler.data_min_[idx]); maxv = float(scaler.data_max_[idx])
                 scaled = 0.0 if maxv == minv else (raw - minv) / (maxv - minv)
@@ -310,32 +393,19 @@ def _build_radar_for_player_row(row_index: int, category_labels: List[str]) -> D
     return {"labels": labels, "values": values}
 
 def get_player_stats_for_radar(player_identifier: str) -> Dict[str, Any]:
-    _ensure_loaded()
-    df = _df_players
-    row_index = None
-    try:
-        pid = int(player_identifier)
-        matches = df.loc[df['Rk'] == pid]
-        if not matches.empty:
-            row_index = matches.index[0]
-    except Exception:
-        needle = unidecode.unidecode(str(player_identifier)).lower()
-        matches = df[df['PlayerNormalized'] == needle]
-        if matches.empty:
-            matches = df[df['PlayerNormalized'].str.contains(needle, na=False)]
-        if matches.empty:
-            raise ValueError(f"Player not found: {player_identifier}")
-        row_index = matches.index[0]
-    radar = _build_radar_for_player_row(row_index, RADAR_CATEGORIES_DEFAULT)
+    state = _ensure_loaded()
+    row_index = _resolve_row(state, player_identifier)
+    if row_index is None:
+        raise ValueError(f"Player not found: {player_identifier}")
+    radar = _build_radar_for_player_row(state, row_index, RADAR_CATEGORIES_DEFAULT)
     return clean(radar)
 
-def _attempt_group_for_player_index(global_index: int) -> str:
-    _ensure_loaded()
-    df = _df_players
+def _attempt_group_for_player_index(state: Dict[str, Any], global_index: int) -> str:
+    df = state['df']
     if global_index not in df.index: raise ValueError(f"Index {global_index} not found in df")
     primary = df.loc[global_index, 'PositionGroup']
-    sim = _pos_similarity.get(primary, None)
-    if isinstance(sim, np.ndarray) and sim.size > 1: return primary
+    index = state['pos_indexes'].get(primary, None)
+    if index is not None and len(index) > 1: return primary
     return primary
 
 def _normalize_filter_param(param):
@@ -354,84 +424,54 @@ def _normalize_filter_param(param):
         return [param.strip().lower()]
     return None
 
-def get_similar_players(player_id: str, top_k: int = 10, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-    _ensure_loaded()
-    df = _df_players
-    matches = None
-    try:
-        pid = int(player_id)
-        matches = df.loc[df['Rk'] == pid]
-    except Exception:
-        needle = unidecode.unidecode(str(player_id)).lower()
-        matches = df[df['PlayerNormalized'] == needle]
-        if matches.empty:
-            matches = df[df['PlayerNormalized'].str.contains(needle, na=False)]
-    if matches is None or matches.empty:
-        raise ValueError(f"Player not found: {player_id}")
-    global_idx = int(matches.index[0])
-    chosen_group = _attempt_group_for_player_index(global_idx)
-
-    candidate_indices = list(df.index)
-    if filters:
-        cands = []
-        min_age = filters.get("min_age")
-        max_age = filters.get("max_age")
-        leagues = _normalize_filter_param(filters.get("leagues"))
-        positions = _normalize_filter_param(filters.get("positions"))
-        
-        for idx in df.index:
-            row = df.loc[idx]
-            ok = True
-            if min_age is not None:
-                try:
-                    if float(row.get("Age", 0)) < float(min_age): ok = False
-                except Exception: pass
-            if max_age is not None:
-                try:
-                    if float(row.get("Age", 0)) > float(max_age): ok = False
-                except Exception: pass
-            if leagues:
-                comp = str(row.get("Comp", "")).lower(); squad = str(row.get("Squad", "")).lower()
-                if not any(l in comp or l in squad for l in leagues): ok = False
-            if positions:
-                posval = str(row.get("Pos", "")).lower()
-                if not any(p == posval.split(",")[0].strip() or p in posval for p in positions): ok = False
-            if ok: cands.append(idx)
-        candidate_indices = cands
-
-    mapping = _pos_index_to_group_index.get(chosen_group, {})
-    group_candidate_pairs = []
-    for idx in candidate_indices:
-        if idx == global_idx: continue
-        if idx in mapping:
-            group_candidate_pairs.append((idx, mapping[idx]))
-    
-    if len(group_candidate_pairs) == 0: return []
+def _vocab_mask(layer: Dict[str, Any], col: str, terms: List[str]) -> np.ndarray:
+    """Rows whose lowercased ``col`` value contains any of ``terms`` (matched per distinct value)."""
+    codes, vocab = layer[col]
+    hits = [i for i, v in enumerate(vocab) if any(t in v for t in terms)]
+    return np.isin(codes, hits)
 
-    query_group_index = _pos_index_to_group_index.get(chosen_group, {}).get(global_idx, None)
-    results = []
-    sim_matrix = _pos_similarity.get(chosen_group, None)
+def _candidate_mask(state: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Vectorized candidate filter over all rows; None when nothing is filtered."""
+    if not filters: return None
+    layer = state['filter_layer']
+    mask = None
     
-    if query_group_index is not None and isinstance(sim_matrix, np.ndarray) and sim_matrix.size > 0:
-        sims = sim_matrix[query_group_index]
-        pairs = []
-        for (gidx, grp_idx) in group_candidate_pairs:
-            if grp_idx < len(sims):
-                score = float(sims[grp_idx])
-                pairs.append((gidx, score))
-        pairs_sorted = sorted(pairs, key=lambda x: x[1], reverse=True)
-    else:
-        return []
+    def _and(m):
+        nonlocal mask
+        mask = m if mask is None else mask & m
+    
+    age = layer["age"]
+    for key, keep_if in (("min_age", np.greater_equal), ("max_age", np.less_equal)):
+        bound = filters.get(key)
+        if bound is None: continue
+        try: bound = float(bound)
+        except Exception: continue
+        # Unparseable ages are kept, as before
+        with np.errstate(invalid="ignore"):
+            _and(keep_if(age, bound) | np.isnan(age))
+    
+    leagues = _normalize_filter_param(filters.get("leagues"))
+    if leagues:
+        _and(_vocab_mask(layer, "Comp", leagues) | _vocab_mask(layer, "Squad", leagues))
+    
+    positions = _normalize_filter_param(filters.get("positions"))
+    if positions:
+        _and(_vocab_mask(layer, "Pos", positions))
+    return mask
 
-    top_pairs = pairs_sorted[:top_k]
+def _resolve_player_index(state: Dict[str, Any], player_id: str) -> int:
+    row_index = _resolve_row(state, player_id)
+    if row_index is None:
+        raise ValueError(f"Player not found: {player_id}")
+    return row_index
+
+def _similar_results(state: Dict[str, Any], top_pairs: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+    df = state['df']
+    results = []
     for gidx, score in top_pairs:
         row = df.loc[gidx]
-        top_stats = {}
-        for c in RADAR_CATEGORIES_DEFAULT:
-            if c in df.columns:
-                try: top_stats[c] = float(row.get(c, 0.0))
-                except Exception: top_stats[c] = 0.0
-        radar = _build_radar_for_player_row(gidx, RADAR_CATEGORIES_DEFAULT)
+        top_stats = {c: float(v) for c, v in zip(state['radar_labels'], state['radar_raw'][gidx])}
+        radar = _build_radar_for_player_row(state, gidx, RADAR_CATEGORIES_DEFAULT)
         results.append({
             "Rk": int(row.get("Rk", int(gidx))),
             "Player": row.get("Player", ""),
@@ -443,6 +483,64 @@ def get_similar_players(player_id: str, top_k: int = 10, filters: Dict[str, Any]
             "top_stats": top_stats,
             "radar": radar
         })
-
     return clean(results)
 
+def get_similar_players(player_id: str, top_k: int = 10, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    state = _ensure_loaded()
+    global_idx = _resolve_player_index(state, player_id)
+    chosen_group = _attempt_group_for_player_index(state, global_idx)
+
+    query_group_index = state['pos_index_to_group_index'].get(chosen_group, {}).get(global_idx, None)
+    index = state['pos_indexes'].get(chosen_group, None)
+    
+    if query_group_index is None or index is None or len(index) == 0:
+        return []
+    
+    # Intersect the columnar filter mask with the group's rows
+    group_rows = state['pos_group_rows'][chosen_group]
+    mask = _candidate_mask(state, filters)
+    in_group = mask[group_rows] if mask is not None else np.ones(len(group_rows), dtype=bool)
+    in_group[query_group_index] = False
+    candidates = np.flatnonzero(in_group)
+    if len(candidates) == 0: return []
+    
+    top_grp, top_scores = index.query(query_group_index, top_k, candidates)
+    return _similar_results(state, [(int(group_rows[g]), float(sc)) for g, sc in zip(top_grp, top_scores)])
+
+def get_similar_players_batch(player_ids: List[str], top_k: int = 10, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """Similar players for many query players sharing one set of filters.
+
+    Filters are evaluated once and each position group's queries are scored
+    with a single matrix multiply. Returns one entry per id, in input order.
+    """
+    state = _ensure_loaded()
+    mask = _candidate_mask(state, filters)
+    out: List[Optional[Dict[str, Any]]] = [None] * len(player_ids)
+    by_group: Dict[str, List[Tuple[int, int, int]]] = {}
+    for slot, pid in enumerate(player_ids):
+        try:
+            global_idx = _resolve_player_index(state, pid)
+        except ValueError as e:
+            out[slot] = {"player_id": pid, "ok": False, "detail": str(e)}
+            continue
+        group = _attempt_group_for_player_index(state, global_idx)
+        query_group_index = state['pos_index_to_group_index'].get(group, {}).get(global_idx, None)
+        index = state['pos_indexes'].get(group, None)
+        out[slot] = {
+            "player_id": pid,
+            "ok": True,
+            "results": [],
+            "input_radar": clean(_build_radar_for_player_row(state, global_idx, RADAR_CATEGORIES_DEFAULT))
+        }
+        if query_group_index is not None and index is not None and len(index) > 0:
+            by_group.setdefault(group, []).append((slot, global_idx, query_group_index))
+
+    for group, queries in by_group.items():
+        group_rows = state['pos_group_rows'][group]
+        candidates = np.flatnonzero(mask[group_rows]) if mask is not None else np.arange(len(group_rows))
+        hits = state['pos_indexes'][group].query_batch(np.array([q for _, _, q in queries]), top_k, candidates)
+        for (slot, _, _), (top_grp, top_scores) in zip(queries, hits):
+            out[slot]["results"] = _similar_results(
+                state, [(int(group_rows[g]), float(sc)) for g, sc in zip(top_grp, top_scores)]
+            )
+    return out
@@ -46,6 +46,11 @@ let datasetMap = {}; // maps player Rk -> dataset index (chart dataset index)
 let featureDescriptions = {};
 let pulsateState = { activeId: null, raf: null, startTime: null };
 let lastCompareResponse = null;
+// Bumped on every comparison so polls for an older AI report stop quietly
+let reportPollToken = 0;
+const REPORT_POLL_MS = 1500;
+// How long a job unknown to the answering worker is still polled for
+const REPORT_MISSING_MS = 60000;
 let showAllFeatures = false;
 
 // For sticky tooltip logic
@@ -608,7 +613,6 @@ async function compareMultiple(ids) {
         });
         const j = await r.json();
         console.log('[DEBUG] Received response:', j);
-        console.log('[DEBUG] AI Report length:', j.ai_report ? j.ai_report.length : 0);
         if (!j.ok) return showError("Compare failed.");
 
         lastCompareResponse = j;
@@ -622,49 +626,81 @@ async function compareMultiple(ids) {
             j.players[0].Player
         );
 
-        // Render AI report with error handling
-        console.log('[DEBUG] AI Report text:', j.ai_report ? j.ai_report.substring(0, 100) : 'NULL');
-        console.log('[DEBUG] marked available?', typeof marked !== 'undefined');
-        
-        if (j.ai_report && j.ai_report.trim()) {
-            try {
-                // Always use simple rendering for reliability
-                let rendered = j.ai_report;
-                
-                // Try markdown parsing
-                if (typeof marked !== 'undefined' && marked.parse) {
-                    console.log('[DEBUG] Using marked.parse()');
-                    rendered = marked.parse(j.ai_report);
-                } else {
-                    console.log('[DEBUG] Using fallback rendering');
-                    // Convert markdown-like syntax to HTML manually
-                    rendered = rendered
-                        .replace(/\n/g, '<br>')
-                        .replace(/\*\*(.+?)\*\*/g, '<strong>$1</strong>')
-                        .replace(/\*(.+?)\*/g, '<em>$1</em>');
-                }
-                
-                aiReportBox.innerHTML = rendered;
-                aiReportBox.style.display = "block";
-                toggleAiReportBtn.innerText = "Hide AI Report";
-                console.log('[DEBUG] AI Report rendered successfully');
-            } catch (err) {
-                console.error('[DEBUG] Error rendering AI report:', err);
-                aiReportBox.innerHTML = '<div style="padding: 20px; background: #fff; color: #333;"><h3>AI Report (Raw)</h3><pre style="white-space: pre-wrap;">' + j.ai_report + '</pre></div>';
-                aiReportBox.style.display = "block";
-                toggleAiReportBtn.innerText = "Hide AI Report";
-            }
+        // Render the cached AI report, or poll its background job
+        reportPollToken += 1;
+        if (j.ai_report) {
+            renderAiReport(j.ai_report);
+        } else if (j.report_job) {
+            showAiReportMessage('<p style="padding: 20px;">Generating AI report...</p>');
+            pollAiReport(j.report_job, reportPollToken);
         } else {
-            console.log('[DEBUG] No AI report in response');
-            aiReportBox.innerHTML = '<p style="padding: 20px; color: #ff6b6b;">No AI report was generated. Please try again.</p>';
-            aiReportBox.style.display = "block";
-            toggleAiReportBtn.innerText = "Hide AI Report";
+            showAiReportMessage('<p style="padding: 20px; color: #ff6b6b;">' + (j.report_detail || 'No AI report was generated. Please try again.') + '</p>');
         }
     } catch (err) {
         showError(err.message || String(err));
     }
 }
 
+async function pollAiReport(jobId, token) {
+    const started = Date.now();
+    while (token === reportPollToken) {
+        try {
+            const r = await fetch(`/api/jobs/${encodeURIComponent(jobId)}`);
+            const j = await r.json();
+            if (token !== reportPollToken) return;
+            // Under several workers the poll can reach one that is not running
+            // the job; the report shows up once the other worker caches it
+            if (r.status === 404 && Date.now() - started < REPORT_MISSING_MS) {
+                await new Promise((resolve) => setTimeout(resolve, REPORT_POLL_MS));
+                continue;
+            }
+            if (!j.ok) {
+                return showAiReportMessage('<p style="padding: 20px; color: #ff6b6b;">' + (j.detail || 'AI report unavailable.') + '</p>');
+            }
+            if (j.job.status === "done") return renderAiReport(j.job.result);
+            if (j.job.status === "failed") {
+                return showAiReportMessage('<p style="padding: 20px; color: #ff6b6b;">AI report failed. Please try again.</p>');
+            }
+        } catch (err) {
+            console.error('[DEBUG] Error polling AI report:', err);
+        }
+        await new Promise((resolve) => setTimeout(resolve, REPORT_POLL_MS));
+    }
+}
+
+function showAiReportMessage(html) {
+    aiReportBox.innerHTML = html;
+    aiReportBox.style.display = "block";
+    toggleAiReportBtn.innerText = "Hide AI Report";
+}
+
+function renderAiReport(report) {
+    console.log('[DEBUG] AI Report text:', report ? report.substring(0, 100) : 'NULL');
+    if (!report || !report.trim()) {
+        console.log('[DEBUG] No AI report in response');
+        return showAiReportMessage('<p style="padding: 20px; color: #ff6b6b;">No AI report was generated. Please try again.</p>');
+    }
+    try {
+        let rendered = report;
+
+        // Try markdown parsing
+        if (typeof marked !== 'undefined' && marked.parse) {
+            rendered = marked.parse(report);
+        } else {
+            // Convert markdown-like syntax to HTML manually
+            rendered = rendered
+                .replace(/\n/g, '<br>')
+                .replace(/\*\*(.+?)\*\*/g, '<strong>$1</strong>')
+                .replace(/\*(.+?)\*/g, '<em>$1</em>');
+        }
+        showAiReportMessage(rendered);
+        console.log('[DEBUG] AI Report rendered successfully');
+    } catch (err) {
+        console.error('[DEBUG] Error rendering AI report:', err);
+        showAiReportMessage('<div style="padding: 20px; background: #fff; color: #333;"><h3>AI Report (Raw)</h3><pre style="white-space: pre-wrap;">' + report + '</pre></div>');
+    }
+}
+
 //
 // RENDER COMPARE BOXES
 //
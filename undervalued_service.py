@@ -0,0 +1,402 @@
+"""
+Cached undervaluation predictions table for the Undervalued Players page.
+
+The predictions CSV is parsed once, its numeric columns are coerced up front and
+the filter option lists are precomputed. For paging, every sortable column gets
+ascending and descending row permutations (NaNs last, ties broken by row order)
+and the categorical filter columns get one boolean bitmap per value, so a page
+request is a bitmap intersection plus a walk down a presorted permutation.
+
+The file's mtime is re-checked at most every player_store.RELOAD_CHECK_INTERVAL
+seconds and everything is rebuilt when it changes.
+"""
+import base64
+import io
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import player_store
+
+PREDICTIONS_CSV_PATH = os.path.join('moneyball_report_outputs', 'all_predictions_with_undervaluation (19).csv')
+
+NUMERIC_COLUMNS = ['Age', 'Market_Value_Million_EUR', 'Predicted_Value', 'Undervaluation']
+
+# Map frontend column names to DataFrame columns
+SORT_COLUMNS = {
+    'rank': 'Undervaluation',  # Default to undervaluation for rank
+    'player': 'Player',
+    'position': 'Main_Pos',
+    'team': 'Squad',
+    'league': 'Comp',
+    'age': 'Age',
+    'market_value': 'Market_Value_Million_EUR',
+    'predicted_value': 'Predicted_Value',
+    'undervaluation': 'Undervaluation'
+}
+DEFAULT_SORT_COLUMN = 'Undervaluation'
+
+# Request filter key -> categorical column with a bitmap index
+CATEGORICAL_FILTERS = {
+    'position': 'Model_Pos',
+    'league': 'Comp',
+    'squad': 'Squad',
+}
+
+# Request filter key -> (numeric column, is lower bound)
+RANGE_FILTERS = {
+    'min_age': ('Age', True),
+    'max_age': ('Age', False),
+    'min_value': ('Market_Value_Million_EUR', True),
+    'max_value': ('Market_Value_Million_EUR', False),
+    'min_undervaluation': ('Undervaluation', True),
+}
+
+# Rows of a permutation examined per step when collecting a filtered page
+_WALK_CHUNK = 1024
+
+_state: Optional[Dict[str, Any]] = None
+_mtime: Optional[float] = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+
+def _sort_key(series: pd.Series) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """Return (orderable float key, NaN flag, sorted labels) for a numeric or string column.
+
+    String columns are keyed by their code in the sorted label array; numeric
+    columns have no labels.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype=float)
+        missing = np.isnan(values)
+        return np.where(missing, 0.0, values), missing, None
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes.astype(float), codes < 0, np.asarray(uniques, dtype=object)
+
+
+def _build_sort_index(df: pd.DataFrame) -> Tuple[Dict[str, Dict[bool, np.ndarray]], Dict[str, Dict[str, Any]]]:
+    """Build per-column sort permutations plus the sorted keys needed to resume a cursor."""
+    rows = np.arange(len(df))
+    perms = {}
+    keys = {}
+    for col in set(SORT_COLUMNS.values()):
+        if col not in df.columns:
+            continue
+        key, missing, labels = _sort_key(df[col])
+        # np.lexsort sorts by the last key first
+        asc = np.lexsort((rows, key, missing)).astype(np.int32)
+        desc = np.lexsort((rows, -key, missing)).astype(np.int32)
+        perms[col] = {True: asc, False: desc}
+        keys[col] = {
+            'labels': labels,
+            'n_present': int(len(df) - np.count_nonzero(missing)),
+            # Direction-adjusted key in permutation order, ascending in both cases
+            'along': {True: key[asc], False: -key[desc]},
+        }
+    return perms, keys
+
+
+def _build_bitmaps(df: pd.DataFrame) -> Dict[str, Dict[Any, np.ndarray]]:
+    bitmaps = {}
+    for col in CATEGORICAL_FILTERS.values():
+        if col not in df.columns:
+            continue
+        codes, uniques = pd.factorize(df[col])
+        bitmaps[col] = {value: codes == i for i, value in enumerate(uniques)}
+    return bitmaps
+
+
+def _ensure_loaded():
+    global _state, _mtime, _last_check
+    now = time.monotonic()
+    if _state is not None and now - _last_check < player_store.RELOAD_CHECK_INTERVAL:
+        return
+    with _lock:
+        if _state is not None and now - _last_check < player_store.RELOAD_CHECK_INTERVAL:
+            return
+        _last_check = now
+        try:
+            mtime = os.path.getmtime(PREDICTIONS_CSV_PATH)
+        except OSError:
+            if _state is None:
+                raise FileNotFoundError(f"CSV not found at {PREDICTIONS_CSV_PATH}.")
+            return
+        if _state is not None and mtime == _mtime:
+            return
+
+        df = pd.read_csv(PREDICTIONS_CSV_PATH)
+        for col in NUMERIC_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+
+        sort_perms, sort_keys = _build_sort_index(df)
+        # Published as a single object so readers never mix two versions
+        _state = {
+            'df': df,
+            'filter_options': {
+                'leagues': df['Comp'].unique().tolist() if 'Comp' in df.columns else [],
+                'squads': df['Squad'].unique().tolist() if 'Squad' in df.columns else [],
+            },
+            'sort_perms': sort_perms,
+            'sort_keys': sort_keys,
+            'bitmaps': _build_bitmaps(df),
+            'numeric': {col: df[col].to_numpy(dtype=float) for col in NUMERIC_COLUMNS if col in df.columns},
+        }
+        _mtime = mtime
+        print(f"[undervalued] Loaded {len(df)} predictions")
+
+
+def _get_state() -> Dict[str, Any]:
+    _ensure_loaded()
+    return _state
+
+
+def get_predictions() -> pd.DataFrame:
+    """Return the shared, pre-coerced predictions frame (treat as read-only)."""
+    return _get_state()['df']
+
+
+def get_filter_options() -> Dict[str, List[Any]]:
+    """Return the precomputed league and squad option lists."""
+    return _get_state()['filter_options']
+
+
+def _resolve_sort_column(state: Dict[str, Any], sort_column: str) -> str:
+    """Map a frontend sort key to a DataFrame column, falling back to Undervaluation."""
+    col = SORT_COLUMNS.get(sort_column, DEFAULT_SORT_COLUMN)
+    if col not in state['sort_perms']:
+        print(f"Warning: Column {col} not found in predictions. Falling back to {DEFAULT_SORT_COLUMN}")
+        col = DEFAULT_SORT_COLUMN
+    return col
+
+
+def _filter_mask(state: Dict[str, Any], filters: Dict[str, Any]) -> Optional[np.ndarray]:
+    """Intersect bitmaps and range predicates; None means every row matches."""
+    mask = None
+    n = len(state['df'])
+    for key, col in CATEGORICAL_FILTERS.items():
+        value = filters.get(key, 'ALL')
+        if value == 'ALL':
+            continue
+        bitmap = state['bitmaps'].get(col, {}).get(value)
+        if bitmap is None:
+            return np.zeros(n, dtype=bool)
+        mask = bitmap.copy() if mask is None else mask & bitmap
+    for key, (col, lower) in RANGE_FILTERS.items():
+        bound = filters.get(key)
+        if bound is None:
+            continue
+        values = state['numeric'][col]
+        # NaN compares False either way, matching pandas boolean masks
+        with np.errstate(invalid='ignore'):
+            hit = values >= bound if lower else values <= bound
+        mask = hit if mask is None else mask & hit
+    return mask
+
+
+def _walk(perm: np.ndarray, mask: Optional[np.ndarray], start: int, stop: int) -> np.ndarray:
+    """Return rows start:stop of ``perm`` restricted to ``mask`` without scanning past stop."""
+    start = max(start, 0)
+    if stop <= start:
+        return perm[:0]
+    if mask is None:
+        return perm[start:stop]
+    parts = []
+    seen = 0
+    for lo in range(0, len(perm), _WALK_CHUNK):
+        chunk = perm[lo:lo + _WALK_CHUNK]
+        hits = chunk[mask[chunk]]
+        if seen + len(hits) > start:
+            parts.append(hits[max(start - seen, 0):stop - seen])
+        seen += len(hits)
+        if seen >= stop:
+            break
+    return np.concatenate(parts) if parts else perm[:0]
+
+
+def query_page(filters: Dict[str, Any], sort_column: str = 'undervaluation', ascending: bool = False,
+               page: int = 1, items_per_page: int = 25) -> Tuple[pd.DataFrame, int]:
+    """Return (page rows, total matching rows) for the given filters and sort."""
+    state = _get_state()
+    col = _resolve_sort_column(state, sort_column)
+    mask = _filter_mask(state, filters)
+    total = len(state['df']) if mask is None else int(np.count_nonzero(mask))
+    start = (page - 1) * items_per_page
+    rows = _walk(state['sort_perms'][col][ascending], mask, start, start + items_per_page)
+    return state['df'].iloc[rows], total
+
+
+def _encode_cursor(state: Dict[str, Any], col: str, ascending: bool, row: int) -> str:
+    value = state['df'][col].iat[row]
+    missing = bool(pd.isna(value))
+    if missing:
+        value = None
+    elif state['sort_keys'][col]['labels'] is None:
+        value = float(value)
+    else:
+        value = str(value)
+    payload = {'s': col, 'a': ascending, 'm': missing, 'v': value, 'r': int(row)}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return {
+            's': str(payload['s']),
+            'a': bool(payload['a']),
+            'm': bool(payload['m']),
+            'v': payload['v'],
+            'r': int(payload['r']),
+        }
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _cursor_start(state: Dict[str, Any], col: str, ascending: bool, missing: bool, value: Any, row: int) -> int:
+    """Return the permutation position just after (value, row) in the sort order."""
+    perm = state['sort_perms'][col][ascending]
+    info = state['sort_keys'][col]
+    n_present = info['n_present']
+    if missing:
+        lo, hi = n_present, len(perm)
+    else:
+        labels = info['labels']
+        if labels is None:
+            key = float(value)
+        else:
+            # Labels absent after a reload sit halfway between their neighbours
+            i = int(np.searchsorted(labels, value))
+            key = float(i) if i < len(labels) and labels[i] == value else i - 0.5
+        key = key if ascending else -key
+        along = info['along'][ascending][:n_present]
+        lo = int(np.searchsorted(along, key, 'left'))
+        hi = int(np.searchsorted(along, key, 'right'))
+    # Ties are ordered by row, so the row number is the tiebreak
+    return lo + int(np.searchsorted(perm[lo:hi], row, 'right'))
+
+
+def query_cursor(filters: Dict[str, Any], sort_column: str = 'undervaluation', ascending: bool = False,
+                 cursor: Optional[str] = None, limit: int = 25) -> Tuple[pd.DataFrame, int, Optional[str]]:
+    """Keyset pagination: return (rows, total matching rows, next cursor or None).
+
+    The cursor fixes the sort column and direction, so ``sort_column`` and
+    ``ascending`` only apply to the first page. Filters must be resent with
+    every request.
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    state = _get_state()
+    start = 0
+    if cursor:
+        c = _decode_cursor(cursor)
+        if c['s'] not in state['sort_perms']:
+            raise ValueError("Invalid cursor")
+        col, ascending = c['s'], c['a']
+        start = _cursor_start(state, col, ascending, c['m'], c['v'], c['r'])
+    else:
+        col = _resolve_sort_column(state, sort_column)
+    mask = _filter_mask(state, filters)
+    total = len(state['df']) if mask is None else int(np.count_nonzero(mask))
+    perm = state['sort_perms'][col][ascending]
+    # Fetch one extra row to know whether another page exists
+    rows = _walk(perm[start:], mask, 0, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(state, col, ascending, int(rows[-1]))
+    return state['df'].iloc[rows], total, next_cursor
+
+
+# Streaming export formats -> response mimetype
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+EXPORT_CHUNK_ROWS = 5000
+
+
+def _iter_chunks(state: Dict[str, Any], filters: Dict[str, Any], sort_column: str, ascending: bool,
+                 chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Filtered rows of state in sort order, as DataFrame slices of at most chunk_size rows.
+
+    Filters are evaluated eagerly so bad input raises before streaming starts.
+    """
+    col = _resolve_sort_column(state, sort_column)
+    mask = _filter_mask(state, filters)
+    perm = state['sort_perms'][col][ascending]
+    df = state['df']
+
+    def _chunks():
+        for lo in range(0, len(perm), chunk_size):
+            rows = perm[lo:lo + chunk_size]
+            if mask is not None:
+                rows = rows[mask[rows]]
+            if len(rows):
+                yield df.iloc[rows]
+
+    return _chunks()
+
+
+def _ndjson_stream(chunks: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield chunk.to_json(orient='records', lines=True, double_precision=15).rstrip('\n').encode('utf-8') + b'\n'
+
+
+def _csv_stream(chunks: Iterator[pd.DataFrame], columns: List[str]) -> Iterator[bytes]:
+    yield (pd.DataFrame(columns=columns).to_csv(index=False)).encode('utf-8')
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=False).encode('utf-8')
+
+
+def _arrow_stream(chunks: Iterator[pd.DataFrame], df: pd.DataFrame) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    # One schema for the whole table so sparse chunks don't infer null columns
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    buf = io.BytesIO()
+
+    def _drain() -> bytes:
+        data = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return data
+
+    writer = pa.ipc.new_stream(buf, schema)
+    yield _drain()
+    for chunk in chunks:
+        writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield _drain()
+    writer.close()
+    yield _drain()
+
+
+def export_stream(filters: Dict[str, Any], fmt: str = 'ndjson', sort_column: str = 'undervaluation',
+                  ascending: bool = False) -> Tuple[Iterator[bytes], str]:
+    """Return (byte generator, mimetype) streaming the filtered set in the given format."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}. Use one of {', '.join(EXPORT_FORMATS)}")
+    state = _get_state()
+    df = state['df']
+    if fmt == 'arrow':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Arrow export requires the optional 'pyarrow' package")
+    chunks = _iter_chunks(state, filters, sort_column, ascending, EXPORT_CHUNK_ROWS)
+    if fmt == 'ndjson':
+        body = _ndjson_stream(chunks)
+    elif fmt == 'csv':
+        body = _csv_stream(chunks, list(df.columns))
+    else:
+        body = _arrow_stream(chunks, df)
+    return body, EXPORT_FORMATS[fmt]
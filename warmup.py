@@ -0,0 +1,94 @@
+"""
+Background warmup and readiness for fast cold starts.
+
+app.py imports only light modules; the player CSV, the search/similarity
+indexes, sklearn and the LLM SDK are loaded on first use. start() does that
+loading in a daemon thread so later requests don't pay for it, and status()
+reports progress for the readiness endpoint. app.py calls start() on each
+worker process's first request rather than at import, so it also works when
+gunicorn --preload imports the app before forking (threads don't survive a
+fork); a process forked after start() begins its own warmup. Steps
+run in order; a failed step is recorded and the rest still run (the affected
+feature then loads lazily on its first request, as before). Set APP_WARMUP=0
+to skip warmup, in which case the app reports ready at once.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+APP_WARMUP = os.getenv('APP_WARMUP', '1').lower() not in ('0', 'false', 'no')
+
+_lock = threading.Lock()
+_steps: List[Tuple[str, Callable[[], Any]]] = []
+_results: Dict[str, Dict[str, Any]] = {}
+_thread: Optional[threading.Thread] = None
+_pid: Optional[int] = None
+_started_at: Optional[float] = None
+_finished_at: Optional[float] = None
+
+
+def add_step(name: str, fn: Callable[[], Any]) -> None:
+    """Register fn to run during warmup; call before start()."""
+    with _lock:
+        _steps.append((name, fn))
+        _results[name] = {'status': 'pending', 'seconds': None, 'error': None}
+
+
+def _run() -> None:
+    global _finished_at
+    for name, fn in list(_steps):
+        with _lock:
+            _results[name]['status'] = 'running'
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            print(f"[warmup] {name} failed: {e}")
+            status, error = 'failed', str(e)
+        else:
+            status, error = 'done', None
+        with _lock:
+            _results[name].update(status=status, error=error, seconds=round(time.perf_counter() - started, 3))
+    with _lock:
+        _finished_at = time.time()
+    print(f"[warmup] Finished in {_finished_at - _started_at:.1f}s")
+
+
+def start() -> None:
+    """Start the warmup thread once per process; later calls do nothing."""
+    global _thread, _pid, _started_at, _finished_at
+    if _thread is not None and _pid == os.getpid():
+        return
+    with _lock:
+        if _thread is not None and _pid == os.getpid():
+            return
+        _pid = os.getpid()
+        _started_at = time.time()
+        _finished_at = None
+        for result in _results.values():
+            result.update(status='pending', seconds=None, error=None)
+        if not APP_WARMUP:
+            _finished_at = _started_at
+            for result in _results.values():
+                result['status'] = 'skipped'
+            _thread = threading.current_thread()
+            return
+        _thread = threading.Thread(target=_run, name='warmup', daemon=True)
+    _thread.start()
+
+
+def is_ready() -> bool:
+    with _lock:
+        return _finished_at is not None
+
+
+def status() -> Dict[str, Any]:
+    """Snapshot of warmup progress for the readiness endpoint."""
+    with _lock:
+        return {
+            'ready': _finished_at is not None,
+            'started_at': _started_at,
+            'finished_at': _finished_at,
+            'steps': {name: dict(result) for name, result in _results.items()},
+        }